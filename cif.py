@@ -22,6 +22,15 @@ class Allocate(Expr):
     num_bytes: int
     tuple_type: any
 
+@dataclass(frozen=True, eq=True)
+class StaticTuple(Expr):
+    values: List[Expr]
+    tuple_type: any
+
+@dataclass(frozen=True, eq=True)
+class GlobalValue(Expr):
+    name: str
+
 @dataclass(frozen=True, eq=True)
 class Constant(Expr):
     val: any
@@ -43,6 +52,12 @@ class Return(Stmt):
 class Collect(Stmt):
     num_bytes: int
 
+@dataclass(frozen=True, eq=True)
+class TupleSet(Stmt):
+    tup: Expr
+    index: int
+    value: Expr
+
 @dataclass(frozen=True, eq=True)
 class Print(Stmt):
     arg: Expr
@@ -56,6 +71,11 @@ class Assign(Stmt):
 class Return(Stmt):
     exp: Expr
 
+@dataclass(frozen=True, eq=True)
+class TailCall(Stmt):
+    func: Expr
+    args: List[Expr]
+
 @dataclass(frozen=True, eq=True)
 class Goto(Stmt):
     label: str
@@ -95,6 +115,13 @@ def print_program(program: CProgram):
                 fun_str = print_exp(fun)
                 args_str = ', '.join([print_exp(a) for a in args])
                 return f'{fun_str}({args_str})'
+            case Allocate(num_bytes, tuple_type):
+                return f'allocate({num_bytes}, {tuple_type})'
+            case StaticTuple(values, _):
+                values_str = ', '.join([print_exp(v) for v in values])
+                return f'static({values_str})'
+            case GlobalValue(name):
+                return f'global({name})'
             case _:
                 raise Exception('unknown expression:', e)
 
@@ -104,10 +131,17 @@ def print_program(program: CProgram):
                 return f'print({print_exp(a)})'
             case Assign(x, e):
                 return f'{x} = {print_exp(e)}'
+            case TupleSet(tup, index, value):
+                return f'{print_exp(tup)}[{index}] = {print_exp(value)}'
+            case Collect(num_bytes):
+                return f'collect({num_bytes})'
             case Return(e):
                 return f'return {print_exp(e)}'
             case Goto(l):
                 return f'goto {l}'
+            case TailCall(fun, args):
+                args_str = ', '.join([print_exp(a) for a in args])
+                return f'tail {print_exp(fun)}({args_str})'
             case If(condition, then_branch, else_branch):
                 return f'if {print_exp(condition)}: goto {then_branch.label} else: goto {else_branch.label}'
             case _:
@@ -1,4 +1,5 @@
-from typing import Set, Dict, Optional
+from typing import Any, Set, Dict, Optional
+import bisect
 import itertools
 import sys
 import traceback
@@ -22,8 +23,29 @@ function_params: Dict[str, List[str]] = {}
 function_return_types = {}
 
 _homes: Dict[str, Dict[x86.Var, x86.Arg]] = {}
+_clobbers: Dict[str, Set[str]] = {}
+peephole_stats: Dict[str, int] = {}
+inlined_calls: Dict[str, int] = {}
+# functions whose dataclass result comes back as fields in rax and rdx,
+# mapped to the field types
+unboxed_returns: Dict[str, List[type]] = {}
+# dataclasses whose fields are updated in place somewhere in the program
+mutable_dataclasses: Set[str] = set()
+# preinitialized tuples for the data section: (tag, field values) -> label
+static_tuples: Dict[Tuple[int, ...], str] = {}
+# variables of each function that may hold a preallocated tuple, and so
+# must never be saved to the root stack
+unrooted_pointers: Dict[str, Set[str]] = {}
+# largest callee body (in statements) that is copied into its callers
+inline_budget = 24
+drop_fallthrough_jumps = True
 debug_sets = True
 
+# 'graph' always uses graph coloring, 'linear' always uses linear scan, and
+# 'auto' switches to linear scan for functions over the size threshold
+register_allocator = 'auto'
+linear_scan_threshold = 2000
+
 
 def log(label, value):
     if global_logging:
@@ -107,6 +129,12 @@ def typecheck(program: Program) -> Program:
         'lte':  bool,
     }
 
+    def lowered(t: type) -> type:
+        # after eliminate_objects, a dataclass argument is passed as a plain tuple
+        if isinstance(t, DataclassType):
+            return tuple(t.fields.values())
+        return t
+
     def tc_exp(e: Expr, env: TEnv) -> type:
         match e:     
             case FieldRef(o, field):
@@ -146,11 +174,14 @@ def typecheck(program: Program) -> Program:
                             assert actual == exp
                         return dt
                     
-                    # normal function call
-                    fn_type = tc_exp(func, env)
-                    assert isinstance(fn_type, Callable)
-                    assert fn_type.args == arg_types
-                    return fn_type.output_type
+                # normal function call
+                fn_type = tc_exp(func, env)
+                assert isinstance(fn_type, Callable)
+                assert [lowered(t) for t in fn_type.args] == [lowered(t) for t in arg_types]
+                if isinstance(func, Var) and func.name in unboxed_returns:
+                    # the call itself produces the first field of the result
+                    return unboxed_returns[func.name][0]
+                return fn_type.output_type
                 
             case Var(x):
                 return env[x]
@@ -167,10 +198,18 @@ def typecheck(program: Program) -> Program:
             case Begin(stmts, e1):
                 tc_stmts(stmts, env)
                 return tc_exp(e1, env)
-            case Prim('tuple', args):
+            case Prim('tuple', args) | Prim('values', args):
                 arg_types = [tc_exp(a, env) for a in args]
                 t = tuple(arg_types)
                 return t
+            case Prim('result', [Var(f), Constant(i)]):
+                return unboxed_returns[f][i]
+            case Prim('tuple_set', [e1, Constant(i), e2]):
+                # stores into field i and produces the same tuple
+                t = tc_exp(e1, env)
+                field_types = list(t.fields.values()) if isinstance(t, DataclassType) else list(t)
+                assert field_types[i] == tc_exp(e2, env)
+                return t
             case Prim('subscript', [e1, Constant(i)]):
                 t = tc_exp(e1, env)
                 # handle both tuple types and DataclassType
@@ -245,6 +284,8 @@ def typecheck(program: Program) -> Program:
                         if isinstance(ptype, str) and ptype in dataclass_var_types:
                             dt = dataclass_var_types[ptype]
                             new_env[pname] = tuple(dt.fields.values())
+                            # the parameter holds a heap pointer the collector must see
+                            tuple_var_types[pname] = new_env[pname]
                         else:
                             new_env[pname] = ptype
 
@@ -265,18 +306,28 @@ def typecheck(program: Program) -> Program:
                 tc_stmts(else_stmts, env)
             case Print(e):
                 tc_exp(e, env)
-                
+
+            case Assign(FieldRef(o, field), e):
+                # updating one field of an existing object in place
+                t_field = tc_exp(FieldRef(o, field), env)
+                t_e = tc_exp(e, env)
+                assert t_field == t_e, f'Expected {t_field} for field {field!r}, but got {t_e}'
+
             case Assign(x, e):
                 t_e = tc_exp(e, env)
                 if isinstance(t_e, DataclassType):
                     env[x] = t_e
                     dataclass_var_types[x] = t_e
                     return
-                if isinstance(e, Call) and isinstance(e.function, Var) and e.function.name in function_names:
+                if isinstance(e, Call) and isinstance(e.function, Var) and e.function.name in function_names \
+                        and e.function.name not in unboxed_returns:
                     func_name = e.function.name
                     if func_name in function_return_types:
                         dataclass_var_types[x] = function_return_types[func_name]
                         env[x] = function_return_types[func_name]
+                        if not has_classes and isinstance(env[x], DataclassType):
+                            # the result is a heap pointer the collector must see
+                            tuple_var_types[x] = tuple(env[x].fields.values())
                         return
                 if isinstance(t_e, tuple):
                     tuple_var_types[x] = t_e
@@ -336,8 +387,20 @@ def rco(prog: Program) -> Program:
                 return stmt
             case FunctionDef(name, params, body_stmts, return_type):
                 return FunctionDef(name, params, rco_stmts(body_stmts), return_type)
+            case Return(Prim('values', args)):
+                return Return(Prim('values', [rco_exp(a, new_stmts) for a in args]))
             case Return(e):
                 return Return(rco_exp(e, new_stmts))
+            case Assign(FieldRef(o, field), e1):
+                return Assign(FieldRef(rco_exp(o, new_stmts), field), rco_exp(e1, new_stmts))
+            case Assign(x, Prim('tuple_set', args)):
+                # the store stays a statement of its own
+                return Assign(x, Prim('tuple_set', [rco_exp(a, new_stmts) for a in args]))
+            case Assign(x, Call(func, args)):
+                # the call is already the whole right-hand side, so it needs no
+                # temporary (this also keeps "return f(...)" recognizable)
+                new_args = [rco_exp(e, new_stmts) for e in args]
+                return Assign(x, Call(rco_exp(func, new_stmts), new_args))
             case Assign(x, e1):
                 new_e1 = rco_exp(e1, new_stmts)
                 return Assign(x, new_e1)
@@ -345,16 +408,23 @@ def rco(prog: Program) -> Program:
                 new_e1 = rco_exp(e1, new_stmts)
                 return Print(new_e1)
             case If(condition, then_stmts, else_stmts):
-                new_condition = rco_exp(condition, new_stmts)
+                new_condition = rco_condition(condition, new_stmts)
                 new_then_stmts = rco_stmts(then_stmts)
                 new_else_stmts = rco_stmts(else_stmts)
 
                 return If(new_condition,
                           new_then_stmts,
                           new_else_stmts)
+            case While(Begin(begin_stmts, begin_exp), body_stmts):
+                # the condition was already flattened by an earlier run of this pass
+                condition_stmts = rco_stmts(begin_stmts)
+                condition_exp = rco_condition(begin_exp, condition_stmts)
+                new_condition = Begin(condition_stmts, condition_exp)
+                new_body_stmts = rco_stmts(body_stmts)
+                return While(new_condition, new_body_stmts)
             case While(condition, body_stmts):
                 condition_stmts = []
-                condition_exp = rco_exp(condition, condition_stmts)
+                condition_exp = rco_condition(condition, condition_stmts)
                 new_condition = Begin(condition_stmts, condition_exp)
                 new_body_stmts = rco_stmts(body_stmts)
                 return While(new_condition, new_body_stmts)
@@ -371,10 +441,25 @@ def rco(prog: Program) -> Program:
 
         return all_stmts
 
+    def rco_condition(e: Expr, new_stmts: List[Stmt]) -> Expr:
+        # comparisons (possibly under "not") stay in place as branch
+        # conditions, so they can be lowered to a compare and a jump
+        match e:
+            case Prim(op, args) if op in comparisons:
+                return Prim(op, [rco_exp(a, new_stmts) for a in args])
+            case Prim('not', [e1]):
+                return Prim('not', [rco_condition(e1, new_stmts)])
+            case _:
+                return rco_exp(e, new_stmts)
+
     def rco_exp(e: Expr, new_stmts: List[Stmt]) -> Expr:
         match e:
             case FieldRef(o, field):
-                return FieldRef(rco_exp(o, new_stmts), field)
+                # fields can be updated in place, so a read must happen in
+                # order with the calls around it
+                new_v = gensym('tmp')
+                new_stmts.append(Assign(new_v, FieldRef(rco_exp(o, new_stmts), field)))
+                return Var(new_v)
             case Call(func, args):
                 new_args = [rco_exp(e, new_stmts) for e in args]
                 new_func = rco_exp(func, new_stmts)
@@ -406,6 +491,27 @@ def rco(prog: Program) -> Program:
 
 
 def eliminate_objects(prog: Program) -> Program:
+    def dataclass_of(o: Expr, field: str, local_types: Dict[str, DataclassType]) -> DataclassType:
+        dt = None # default to None
+        # if it's any dataclass‐typed var (Point, p1, p2, p3)…
+        if isinstance(o, Var):
+            if o.name in local_types:
+                dt = local_types[o.name]
+            elif o.name in dataclass_var_types:
+                dt = dataclass_var_types[o.name]
+            # check if this is a result of a function returning a dataclass
+            elif o.name.startswith('tmp_') or o.name in function_params.get('main', []):
+                # try to find a dataclass that has the field we're accessing
+                for cls_name, cls_type in dataclass_var_types.items():
+                    if isinstance(cls_type, DataclassType) and field in cls_type.fields:
+                        dt = cls_type
+                        dataclass_var_types[o.name] = dt  # track this
+                        break
+
+        if dt is None:
+            raise TypeError(f"Expected DataclassType or tuple for {o}, but got {dt}")
+        return dt
+
     def elim_expr(e: Expr, local_types: Dict[str, DataclassType]) -> Expr:
         match e:
             # 1) constructor calls -> tuple
@@ -418,29 +524,13 @@ def eliminate_objects(prog: Program) -> Program:
 
             # 3) field read -> subscript
             case FieldRef(o, field):
-                dt = None # default to None
                 # 1) recurse into the object
                 o1 = elim_expr(o, local_types)
 
-                # 2) if it's any dataclass‐typed var (Point, p1, p2, p3)…
-                if isinstance(o, Var):
-                    if o.name in local_types:
-                        dt = local_types[o.name]
-                    elif o.name in dataclass_var_types:
-                        dt = dataclass_var_types[o.name]
-                    # check if this is a result of a function returning a dataclass
-                    elif o.name.startswith('tmp_') or o.name in function_params.get('main', []):
-                        # try to find a dataclass that has the field we're accessing
-                        for cls_name, cls_type in dataclass_var_types.items():
-                            if isinstance(cls_type, DataclassType) and field in cls_type.fields:
-                                dt = cls_type
-                                dataclass_var_types[o.name] = dt  # track this
-                                break
-                        
-                if dt is None:
-                    raise TypeError(f"Expected DataclassType or tuple for {o}, but got {dt}")
-
-                # 4) find which field index this is, and build a subscript
+                # 2) look up the dataclass of the object
+                dt = dataclass_of(o, field, local_types)
+
+                # 3) find which field index this is, and build a subscript
                 idx = list(dt.fields.keys()).index(field)
                 return Prim('subscript', [o1, Constant(idx)])
             
@@ -478,6 +568,13 @@ def eliminate_objects(prog: Program) -> Program:
                 ]
                 return FunctionDef(name, params, new_body, ret)
 
+            # field update -> store into the same tuple
+            case Assign(FieldRef(Var(o), field), e):
+                dt = dataclass_of(Var(o), field, local_types)
+                mutable_dataclasses.add(dt.name)
+                idx = list(dt.fields.keys()).index(field)
+                return Assign(o, Prim('tuple_set', [Var(o), Constant(idx), elim_expr(e, local_types)]))
+
             case Assign(x, e):
                 return Assign(x, elim_expr(e, local_types))
 
@@ -508,6 +605,862 @@ def eliminate_objects(prog: Program) -> Program:
     return Program(out)
 
 
+##################################################
+# inline-functions
+##################################################
+
+def inline_functions(prog: Program) -> Program:
+    """
+    Replaces direct calls to small, non-recursive functions with a renamed
+    copy of the callee's body. Each return in the copy becomes an assignment
+    to the call's destination; a return that is not the last statement of
+    the body is handled by moving the statements after its "if" into the
+    other arm. How often each function was inlined is kept in `inlined_calls`.
+    :param prog: An Lfun program, after objects have been eliminated
+    :return: An equivalent Lfun program with fewer calls
+    """
+    inlined_calls.clear()
+    defs = {s.name: s for s in prog.stmts if isinstance(s, FunctionDef)}
+
+    # ----------------------------------------
+    def stmts_size(stmts: List[Stmt]) -> int:
+        total = 0
+        for s in stmts:
+            match s:
+                case If(_, then_stmts, else_stmts):
+                    total += 1 + stmts_size(then_stmts) + stmts_size(else_stmts)
+                case While(Begin(condition_stmts, _), body_stmts):
+                    total += 1 + stmts_size(condition_stmts) + stmts_size(body_stmts)
+                case _:
+                    total += 1
+        return total
+
+    def direct_callees(stmts: List[Stmt]) -> Set[str]:
+        found = set()
+        for s in stmts:
+            match s:
+                case Assign(_, Call(Var(f), _)) if f in defs:
+                    found.add(f)
+                case If(_, then_stmts, else_stmts):
+                    found |= direct_callees(then_stmts) | direct_callees(else_stmts)
+                case While(Begin(condition_stmts, _), body_stmts):
+                    found |= direct_callees(condition_stmts) | direct_callees(body_stmts)
+        return found
+
+    def has_return(stmts: List[Stmt]) -> bool:
+        for s in stmts:
+            match s:
+                case Return(_):
+                    return True
+                case If(_, then_stmts, else_stmts) if has_return(then_stmts + else_stmts):
+                    return True
+                case While(_, body_stmts) if has_return(body_stmts):
+                    return True
+        return False
+
+    # ----------------------------------------
+    # a function is recursive if it can reach itself through direct calls
+    callees = {name: direct_callees(d.body_stmts) for name, d in defs.items()}
+
+    def reachable(name: str) -> Set[str]:
+        seen = set()
+        work = list(callees[name])
+        while work:
+            f = work.pop()
+            if f not in seen:
+                seen.add(f)
+                work += callees[f]
+        return seen
+
+    recursive = {name for name in defs if name in reachable(name)}
+
+    # ----------------------------------------
+    def returns_in_tail(stmts: List[Stmt]) -> Optional[List[Stmt]]:
+        # rewrites the body so that every return ends its path, or gives up
+        # (None) if a return sits in a loop or some path never returns
+        for n, s in enumerate(stmts):
+            match s:
+                case Return(_):
+                    return stmts[:n + 1]
+                case If(condition, then_stmts, else_stmts) if has_return(then_stmts + else_stmts):
+                    rest = stmts[n + 1:]
+                    new_then = returns_in_tail(then_stmts + rest)
+                    new_else = returns_in_tail(else_stmts + rest)
+                    if new_then is None or new_else is None:
+                        return None
+                    return stmts[:n] + [If(condition, new_then, new_else)]
+                case While(_, body_stmts) if has_return(body_stmts):
+                    return None
+        return None
+
+    # ----------------------------------------
+    def rename_expr(e: Expr, names: Dict[str, str]) -> Expr:
+        match e:
+            case Var(x):
+                return Var(names.get(x, x))
+            case Prim(op, args):
+                return Prim(op, [rename_expr(a, names) for a in args])
+            case Call(func, args):
+                return Call(rename_expr(func, names), [rename_expr(a, names) for a in args])
+            case Begin(stmts, e1):
+                return Begin(rename_stmts(stmts, names, None), rename_expr(e1, names))
+            case _:
+                return e
+
+    def rename_stmts(stmts: List[Stmt], names: Dict[str, str], result: Optional[str]) -> List[Stmt]:
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case Assign(x, e):
+                    new_stmts.append(Assign(names.get(x, x), rename_expr(e, names)))
+                case Print(e):
+                    new_stmts.append(Print(rename_expr(e, names)))
+                case Return(e):
+                    new_stmts.append(Assign(result, rename_expr(e, names)))
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(rename_expr(condition, names),
+                                        rename_stmts(then_stmts, names, result),
+                                        rename_stmts(else_stmts, names, result)))
+                case While(condition, body_stmts):
+                    new_stmts.append(While(rename_expr(condition, names),
+                                           rename_stmts(body_stmts, names, result)))
+                case _:
+                    raise Exception('inline rename_stmts', s)
+        return new_stmts
+
+    def assigned_vars(stmts: List[Stmt]) -> Set[str]:
+        found = set()
+        for s in stmts:
+            match s:
+                case Assign(x, _):
+                    found.add(x)
+                case If(_, then_stmts, else_stmts):
+                    found |= assigned_vars(then_stmts) | assigned_vars(else_stmts)
+                case While(Begin(condition_stmts, _), body_stmts):
+                    found |= assigned_vars(condition_stmts) | assigned_vars(body_stmts)
+        return found
+
+    # ----------------------------------------
+    # callees are processed before their callers, so an inlined body
+    # already has its own small callees expanded
+    new_bodies: Dict[str, List[Stmt]] = {}
+    candidates: Dict[str, Optional[List[Stmt]]] = {}
+
+    def body_of(name: str) -> List[Stmt]:
+        if name not in new_bodies:
+            new_bodies[name] = defs[name].body_stmts   # guards against cycles
+            new_bodies[name] = inline_stmts(defs[name].body_stmts)
+        return new_bodies[name]
+
+    def candidate(name: str) -> Optional[List[Stmt]]:
+        # the callee's body in tail-return form, or None if it must stay a call
+        if name not in candidates:
+            body = None
+            if name not in recursive:
+                body = returns_in_tail(body_of(name))
+                if body is not None and stmts_size(body) > inline_budget:
+                    body = None
+            candidates[name] = body
+        return candidates[name]
+
+    def expand(x: str, name: str, args: List[Expr]) -> List[Stmt]:
+        body = candidate(name)
+        params = [p for p, _ in defs[name].params]
+        names = {v: gensym(v) for v in params + sorted(assigned_vars(body))}
+        for old, new in names.items():
+            if old in tuple_var_types:
+                tuple_var_types[new] = tuple_var_types[old]
+            if old in dataclass_var_types:
+                dataclass_var_types[new] = dataclass_var_types[old]
+
+        inlined_calls[name] = inlined_calls.get(name, 0) + 1
+        copies = [Assign(names[p], a) for p, a in zip(params, args)]
+        return copies + rename_stmts(body, names, x)
+
+    def inline_stmts(stmts: List[Stmt]) -> List[Stmt]:
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case Assign(x, Call(Var(f), args)) if f in defs and candidate(f) is not None:
+                    new_stmts += expand(x, f, args)
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(condition, inline_stmts(then_stmts), inline_stmts(else_stmts)))
+                case While(Begin(condition_stmts, condition_exp), body_stmts):
+                    new_stmts.append(While(Begin(inline_stmts(condition_stmts), condition_exp),
+                                           inline_stmts(body_stmts)))
+                case _:
+                    new_stmts.append(s)
+        return new_stmts
+
+    new_stmts = []
+    for s in prog.stmts:
+        match s:
+            case FunctionDef(name, params, _, return_type):
+                new_stmts.append(FunctionDef(name, params, body_of(name), return_type))
+            case _:
+                new_stmts += inline_stmts([s])
+
+    log('inlined calls', inlined_calls)
+    return Program(new_stmts)
+
+
+##################################################
+# fold-constants
+##################################################
+
+constant_ops = {
+    'add': lambda a, b: a + b,
+    'sub': lambda a, b: a - b,
+    'mult': lambda a, b: a * b,
+    'eq': lambda a, b: a == b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+    'and': lambda a, b: a and b,
+    'or': lambda a, b: a or b,
+    'not': lambda a: not a,
+}
+
+
+def fold_constants(prog: Program) -> Program:
+    """
+    Evaluates operators whose arguments are constants, propagates constants
+    through assignments, reads fields of tuples whose contents are known,
+    and deletes "if" arms and "while" loops that can never run. Integer
+    results that don't fit in a 32-bit immediate are left alone.
+    :param prog: An Lfun program with atomic operator arguments
+    :return: An equivalent Lfun program
+    """
+
+    # ----------------------------------------
+    # env maps a variable either to the Constant it holds, or to the list of
+    # atoms a tuple it points to was built from
+    def fold_atm(a: Expr, env: Dict[str, Any]) -> Expr:
+        match a:
+            case Var(x) if isinstance(env.get(x), Constant):
+                return env[x]
+            case _:
+                return a
+
+    def fits(c: Any) -> bool:
+        return isinstance(c, bool) or -2**31 <= c < 2**31
+
+    def fold_expr(e: Expr, env: Dict[str, Any]) -> Expr:
+        match e:
+            case Prim(op, args):
+                new_args = [fold_expr(a, env) if isinstance(a, Prim) else fold_atm(a, env)
+                            for a in args]
+                match op, new_args:
+                    case _ if op in constant_ops and all(isinstance(a, Constant) for a in new_args):
+                        result = constant_ops[op](*[a.val for a in new_args])
+                        if fits(result):
+                            return Constant(result)
+                    case 'and', [Constant(c), other] | [other, Constant(c)]:
+                        return other if c else Constant(False)
+                    case 'or', [Constant(c), other] | [other, Constant(c)]:
+                        return Constant(True) if c else other
+                    case 'subscript', [Var(t), Constant(i)] if isinstance(env.get(t), list):
+                        field = env[t][i]
+                        if isinstance(field, Constant):
+                            return field
+                return Prim(op, new_args)
+            case Call(func, args):
+                return Call(func, [fold_atm(a, env) for a in args])
+            case _:
+                return fold_atm(e, env)
+
+    def assigned_vars(stmts: List[Stmt]) -> Set[str]:
+        found = set()
+        for s in stmts:
+            match s:
+                case Assign(x, _):
+                    found.add(x)
+                case If(_, then_stmts, else_stmts):
+                    found |= assigned_vars(then_stmts) | assigned_vars(else_stmts)
+                case While(Begin(condition_stmts, _), body_stmts):
+                    found |= assigned_vars(condition_stmts) | assigned_vars(body_stmts)
+        return found
+
+    def has_stores(stmts: List[Stmt]) -> bool:
+        for s in stmts:
+            match s:
+                case Assign(_, Prim('tuple_set', _)):
+                    return True
+                case If(_, then_stmts, else_stmts) if has_stores(then_stmts + else_stmts):
+                    return True
+                case While(Begin(condition_stmts, _), body_stmts) if has_stores(condition_stmts + body_stmts):
+                    return True
+                case FunctionDef(_, _, body_stmts, _) if has_stores(body_stmts):
+                    return True
+        return False
+
+    def forget_tuples(env: Dict[str, Any]):
+        # a store may go through any name of the tuple, so once one happens
+        # nothing is known about the contents of any tuple
+        for x in [x for x, fact in env.items() if isinstance(fact, list)]:
+            del env[x]
+
+    # ----------------------------------------
+    def fold_stmts(stmts: List[Stmt], env: Dict[str, Any]) -> List[Stmt]:
+        new_stmts = []
+        for s in stmts:
+            new_stmts += fold_stmt(s, env)
+        return new_stmts
+
+    def fold_stmt(s: Stmt, env: Dict[str, Any]) -> List[Stmt]:
+        match s:
+            case Assign(x, e):
+                new_e = fold_expr(e, env)
+                match new_e:
+                    case Prim('tuple_set', [Var(t), Constant(i), value]):
+                        fields = env.get(t)
+                        forget_tuples(env)
+                        if isinstance(fields, list):
+                            env[x] = fields[:i] + [value] + fields[i + 1:]
+                        return [Assign(x, new_e)]
+                    case Call(_, _) if stores:
+                        # the callee may store into any tuple it can reach
+                        forget_tuples(env)
+                env.pop(x, None)
+                match new_e:
+                    case Constant(_):
+                        env[x] = new_e
+                    case Prim('tuple', args):
+                        env[x] = args
+                    case Var(y) if isinstance(env.get(y), list):
+                        env[x] = env[y]
+                return [Assign(x, new_e)]
+            case Print(e):
+                return [Print(fold_expr(e, env))]
+            case Return(e):
+                return [Return(fold_expr(e, env))]
+            case If(condition, then_stmts, else_stmts):
+                match fold_expr(condition, env):
+                    case Constant(c):
+                        return fold_stmts(then_stmts if c else else_stmts, env)
+                    case new_condition:
+                        then_env = env.copy()
+                        else_env = env.copy()
+                        new_then = fold_stmts(then_stmts, then_env)
+                        new_else = fold_stmts(else_stmts, else_env)
+                        # after the join, only facts true on both arms survive
+                        for x in list(env):
+                            if x not in then_env or x not in else_env or then_env[x] != else_env[x]:
+                                del env[x]
+                        for x in then_env.keys() & else_env.keys() - env.keys():
+                            if then_env[x] == else_env[x]:
+                                env[x] = then_env[x]
+                        return [If(new_condition, new_then, new_else)]
+            case While(Begin(condition_stmts, condition_exp), body_stmts):
+                # a loop whose test is false on entry only runs its test
+                entry_env = env.copy()
+                entry_stmts = fold_stmts(condition_stmts, entry_env)
+                if fold_expr(condition_exp, entry_env) == Constant(False):
+                    env.clear()
+                    env.update(entry_env)
+                    return entry_stmts
+
+                for x in assigned_vars(condition_stmts + body_stmts):
+                    env.pop(x, None)
+                if stores:
+                    forget_tuples(env)
+                new_condition_stmts = fold_stmts(condition_stmts, env)
+                new_condition_exp = fold_expr(condition_exp, env)
+                new_body = fold_stmts(body_stmts, env.copy())
+                return [While(Begin(new_condition_stmts, new_condition_exp), new_body)]
+            case FunctionDef(name, params, body_stmts, return_type):
+                return [FunctionDef(name, params, fold_stmts(body_stmts, {}), return_type)]
+            case _:
+                return [s]
+
+    match prog:
+        case Program(stmts):
+            stores = has_stores(stmts)
+            return Program(fold_stmts(stmts, {}))
+
+
+##################################################
+# unbox-calls
+##################################################
+
+def unbox_calls(prog: Program) -> Program:
+    """
+    Changes the calling convention of functions with small dataclass
+    parameters or results: each field of such a parameter is passed in its
+    own argument register, and the fields of such a result come back in rax
+    and rdx, instead of a pointer to a heap tuple. The callee rebuilds a
+    parameter tuple on entry and the caller rebuilds a result tuple after
+    the call; scalar-replace removes both wherever the value doesn't escape.
+    Functions that are also used as values keep the boxed convention, since
+    their indirect callers can't know about it.
+    :param prog: An Lfun program, after objects have been eliminated
+    :return: An equivalent Lfun program
+    """
+    unboxed_returns.clear()
+    defs = {s.name: s for s in prog.stmts if isinstance(s, FunctionDef)}
+
+    # ----------------------------------------
+    def small_fields(t: Any) -> Optional[List[type]]:
+        # the field types of a dataclass with only int and bool fields; an
+        # object that is updated in place can't be copied into registers
+        if isinstance(t, str) and isinstance(dataclass_var_types.get(t), DataclassType) \
+                and t not in mutable_dataclasses:
+            field_types = list(dataclass_var_types[t].fields.values())
+            if all(ft in (int, bool) for ft in field_types):
+                return field_types
+        return None
+
+    def function_values(e: Expr) -> Set[str]:
+        # the functions referred to by e other than as the callee of a call
+        match e:
+            case Var(x):
+                return {x} & defs.keys()
+            case Call(Var(_), args) | Prim(_, args):
+                return set().union(*[function_values(a) for a in args])
+            case Call(func, args):
+                return function_values(func).union(*[function_values(a) for a in args])
+            case Begin(stmts, e1):
+                return stmts_function_values(stmts) | function_values(e1)
+            case _:
+                return set()
+
+    def stmts_function_values(stmts: List[Stmt]) -> Set[str]:
+        found = set()
+        for s in stmts:
+            match s:
+                case Assign(_, e) | Print(e) | Return(e):
+                    found |= function_values(e)
+                case If(condition, then_stmts, else_stmts):
+                    found |= function_values(condition) | stmts_function_values(then_stmts + else_stmts)
+                case While(condition, body_stmts):
+                    found |= function_values(condition) | stmts_function_values(body_stmts)
+                case FunctionDef(_, _, body_stmts, _):
+                    found |= stmts_function_values(body_stmts)
+        return found
+
+    # ----------------------------------------
+    # decide the convention of each function: which parameters are passed
+    # as fields (as long as the arguments still fit in registers), and
+    # whether the result is returned as fields
+    escaping_functions = stmts_function_values(prog.stmts)
+    unboxed_params: Dict[str, List[Optional[List[type]]]] = {}
+    for name, d in defs.items():
+        if name in escaping_functions:
+            continue
+        free_registers = len(constants.argument_registers) - len(d.params)
+        param_fields = []
+        for _, t in d.params:
+            field_types = small_fields(t)
+            if field_types is not None and len(field_types) - 1 <= free_registers:
+                free_registers -= len(field_types) - 1
+                param_fields.append(field_types)
+            else:
+                param_fields.append(None)
+        if any(param_fields):
+            unboxed_params[name] = param_fields
+
+        field_types = small_fields(d.return_type)
+        if field_types is not None and len(field_types) <= 2:
+            unboxed_returns[name] = field_types
+
+    # ----------------------------------------
+    def unbox_stmts(stmts: List[Stmt]) -> List[Stmt]:
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case Assign(x, Call(Var(f), args)) if f in unboxed_params or f in unboxed_returns:
+                    new_args = []
+                    for a, field_types in zip(args, unboxed_params.get(f, [None] * len(args))):
+                        if field_types is None:
+                            new_args.append(a)
+                        else:
+                            new_args += [Prim('subscript', [a, Constant(i)]) for i in range(len(field_types))]
+
+                    if f in unboxed_returns:
+                        # the first field comes back in rax like any result,
+                        # the second one in rdx
+                        results = [gensym(x) for _ in unboxed_returns[f]]
+                        new_stmts.append(Assign(results[0], Call(Var(f), new_args)))
+                        new_stmts += [Assign(r, Prim('result', [Var(f), Constant(i)]))
+                                      for i, r in enumerate(results) if i > 0]
+                        new_stmts.append(Assign(x, Prim('tuple', [Var(r) for r in results])))
+                    else:
+                        new_stmts.append(Assign(x, Call(Var(f), new_args)))
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(condition, unbox_stmts(then_stmts), unbox_stmts(else_stmts)))
+                case While(Begin(condition_stmts, condition_exp), body_stmts):
+                    new_stmts.append(While(Begin(unbox_stmts(condition_stmts), condition_exp),
+                                           unbox_stmts(body_stmts)))
+                case _:
+                    new_stmts.append(s)
+        return new_stmts
+
+    def unbox_returns(stmts: List[Stmt], num_fields: int) -> List[Stmt]:
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case Return(e):
+                    new_stmts.append(Return(Prim('values', [Prim('subscript', [e, Constant(i)])
+                                                            for i in range(num_fields)])))
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(condition,
+                                        unbox_returns(then_stmts, num_fields),
+                                        unbox_returns(else_stmts, num_fields)))
+                case While(condition, body_stmts):
+                    new_stmts.append(While(condition, unbox_returns(body_stmts, num_fields)))
+                case _:
+                    new_stmts.append(s)
+        return new_stmts
+
+    def unbox_function(d: FunctionDef) -> FunctionDef:
+        params = []
+        prologue = []
+        for (p, t), field_types in zip(d.params, unboxed_params.get(d.name, [None] * len(d.params))):
+            if field_types is None:
+                params.append((p, t))
+            else:
+                names = [gensym(p) for _ in field_types]
+                params += list(zip(names, field_types))
+                prologue.append(Assign(p, Prim('tuple', [Var(n) for n in names])))
+
+        body = prologue + unbox_stmts(d.body_stmts)
+        if d.name in unboxed_returns:
+            body = unbox_returns(body, len(unboxed_returns[d.name]))
+        return FunctionDef(d.name, params, body, d.return_type)
+
+    new_stmts = []
+    for s in prog.stmts:
+        match s:
+            case FunctionDef():
+                new_stmts.append(unbox_function(s))
+            case _:
+                new_stmts += unbox_stmts([s])
+
+    log('unboxed parameters', unboxed_params)
+    log('unboxed results', unboxed_returns)
+    return Program(new_stmts)
+
+
+##################################################
+# scalar-replace
+##################################################
+
+def scalar_replace(prog: Program) -> Program:
+    """
+    Replaces tuples that never escape with one plain variable per field, so
+    they are never allocated. A tuple escapes unless every use of it reads a
+    field or copies it into another variable that doesn't escape either; one
+    passed to a call, returned, printed, compared or stored into another
+    tuple escapes. A store into a field of a replaced tuple becomes an
+    assignment to that field's variable, as long as the tuple is never
+    copied.
+    :param prog: An Lfun program, after objects have been eliminated
+    :return: An equivalent Lfun program with fewer tuples
+    """
+
+    # ----------------------------------------
+    # how each variable is defined and used in one function body: defined by
+    # ('tuple', size), ('copy', source), 'store' (into one of its fields) or
+    # 'other', and used by 'field', ('copy', destination) or 'escape'
+    def scan_expr(e: Expr, uses: Dict[str, Set]):
+        match e:
+            case Prim('subscript', [Var(t), Constant(_)]):
+                uses.setdefault(t, set()).add('field')
+            case Var(x):
+                uses.setdefault(x, set()).add('escape')
+            case Prim(_, args):
+                for a in args:
+                    scan_expr(a, uses)
+            case Call(func, args):
+                for a in [func] + args:
+                    scan_expr(a, uses)
+
+    def scan(stmts: List[Stmt], defs: Dict[str, Set], uses: Dict[str, Set]):
+        for s in stmts:
+            match s:
+                case Assign(x, Prim('tuple', args)):
+                    defs.setdefault(x, set()).add(('tuple', len(args)))
+                    for a in args:
+                        scan_expr(a, uses)
+                case Assign(x, Prim('tuple_set', [Var(t), Constant(_), value])) if x == t:
+                    defs.setdefault(x, set()).add('store')
+                    scan_expr(value, uses)
+                case Assign(x, Var(y)):
+                    defs.setdefault(x, set()).add(('copy', y))
+                    uses.setdefault(y, set()).add(('copy', x))
+                case Assign(x, e):
+                    defs.setdefault(x, set()).add('other')
+                    scan_expr(e, uses)
+                case Print(e) | Return(e):
+                    scan_expr(e, uses)
+                case If(condition, then_stmts, else_stmts):
+                    scan_expr(condition, uses)
+                    scan(then_stmts, defs, uses)
+                    scan(else_stmts, defs, uses)
+                case While(Begin(condition_stmts, condition_exp), body_stmts):
+                    scan(condition_stmts, defs, uses)
+                    scan_expr(condition_exp, uses)
+                    scan(body_stmts, defs, uses)
+
+    def replaceable(defs: Dict[str, Set], uses: Dict[str, Set]) -> Dict[str, int]:
+        # maps each replaceable variable to the number of fields it has
+        def partners(x: str) -> Set[str]:
+            return {h[1] for h in defs[x] | uses.get(x, set()) if isinstance(h, tuple) and h[0] == 'copy'}
+
+        candidates = {x for x, how in defs.items()
+                      if all(isinstance(h, tuple) or h == 'store' for h in how)
+                      and all(h == 'field' or isinstance(h, tuple) for h in uses.get(x, set()))}
+        # a tuple that is stored into is shared by all of its copies
+        candidates -= {x for x in candidates if 'store' in defs[x] and partners(x)}
+
+        # a variable copied to or from one that escapes escapes as well
+        changed = True
+        while changed:
+            changed = False
+            for x in list(candidates):
+                if not partners(x) <= candidates:
+                    candidates.discard(x)
+                    changed = True
+
+        # variables connected by copies have the size of the tuples built
+        # into any of them
+        sizes = {x: h[1] for x in candidates for h in defs[x] if isinstance(h, tuple) and h[0] == 'tuple'}
+        changed = True
+        while changed:
+            changed = False
+            for x in candidates:
+                for y in partners(x):
+                    if x in sizes and y not in sizes:
+                        sizes[y] = sizes[x]
+                        changed = True
+        return sizes
+
+    # ----------------------------------------
+    def replace_expr(e: Expr, fields: Dict[str, List[str]]) -> Expr:
+        match e:
+            case Prim('subscript', [Var(t), Constant(i)]) if t in fields:
+                return Var(fields[t][i])
+            case Prim(op, args):
+                return Prim(op, [replace_expr(a, fields) for a in args])
+            case Call(func, args):
+                return Call(func, [replace_expr(a, fields) for a in args])
+            case _:
+                return e
+
+    def assign_fields(targets: List[str], values: List[Expr]) -> List[Stmt]:
+        # the values may read the fields being assigned (as in p = P(p.y, p.x)),
+        # so they are all computed into temporaries first
+        temps = [gensym('tmp') for _ in targets]
+        return [Assign(t, v) for t, v in zip(temps, values)] + \
+            [Assign(f, Var(t)) for f, t in zip(targets, temps)]
+
+    def replace_stmts(stmts: List[Stmt], fields: Dict[str, List[str]]) -> List[Stmt]:
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case Assign(x, Prim('tuple', args)) if x in fields:
+                    new_stmts += assign_fields(fields[x], [replace_expr(a, fields) for a in args])
+                case Assign(x, Var(y)) if x in fields:
+                    new_stmts += assign_fields(fields[x], [Var(g) for g in fields[y]])
+                case Assign(x, Prim('tuple_set', [Var(_), Constant(i), value])) if x in fields:
+                    new_stmts.append(Assign(fields[x][i], replace_expr(value, fields)))
+                case Assign(x, e):
+                    new_stmts.append(Assign(x, replace_expr(e, fields)))
+                case Print(e):
+                    new_stmts.append(Print(replace_expr(e, fields)))
+                case Return(e):
+                    new_stmts.append(Return(replace_expr(e, fields)))
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(replace_expr(condition, fields),
+                                        replace_stmts(then_stmts, fields),
+                                        replace_stmts(else_stmts, fields)))
+                case While(Begin(condition_stmts, condition_exp), body_stmts):
+                    new_stmts.append(While(Begin(replace_stmts(condition_stmts, fields),
+                                                 replace_expr(condition_exp, fields)),
+                                           replace_stmts(body_stmts, fields)))
+                case _:
+                    new_stmts.append(s)
+        return new_stmts
+
+    def fields_of(stmts: List[Stmt], params: List[str]) -> Dict[str, List[str]]:
+        defs = {p: {'other'} for p in params}
+        uses = {}
+        scan(stmts, defs, uses)
+        sizes = replaceable(defs, uses)
+        return {x: [gensym(x) for _ in range(n)] for x, n in sorted(sizes.items())}
+
+    match prog:
+        case Program(stmts):
+            main_fields = fields_of([s for s in stmts if not isinstance(s, FunctionDef)], [])
+            new_stmts = []
+            for s in stmts:
+                match s:
+                    case FunctionDef(name, params, body_stmts, return_type):
+                        fields = fields_of(body_stmts, [p for p, _ in params])
+                        log(f'scalar replaced tuples in {name}', list(fields))
+                        new_stmts.append(FunctionDef(name, params, replace_stmts(body_stmts, fields), return_type))
+                    case _:
+                        new_stmts += replace_stmts([s], main_fields)
+            log('scalar replaced tuples in main', list(main_fields))
+            return Program(new_stmts)
+
+
+##################################################
+# reduce-induction-variables
+##################################################
+
+def reduce_induction_variables(prog: Program) -> Program:
+    """
+    Replaces multiplications of a loop's induction variable by a constant
+    with a running total. A variable is an induction variable of a loop if
+    every assignment to it in the loop adds or subtracts a constant; each
+    product "i * c" then gets its own variable, set to i * c before the loop
+    and increased by step * c right after every step of i, so the loop reads
+    it instead of multiplying.
+    :param prog: An Lfun program with atomic operator arguments
+    :return: An equivalent Lfun program
+    """
+    reduced = {}
+
+    # ----------------------------------------
+    def fits(c: int) -> bool:
+        return -2**31 <= c < 2**31
+
+    def step_of(e: Expr, i: str) -> Optional[int]:
+        # the constant e adds to i, if it is i plus or minus a constant
+        match e:
+            case Prim('add', [Var(x), Constant(c)]) | Prim('add', [Constant(c), Var(x)]) \
+                    if x == i and not isinstance(c, bool):
+                return c
+            case Prim('sub', [Var(x), Constant(c)]) if x == i and not isinstance(c, bool):
+                return -c
+            case _:
+                return None
+
+    def step_at(stmts: List[Stmt], n: int) -> Optional[int]:
+        # the step of the assignment stmts[n]; rco leaves a step as
+        # "t = add(i, c)" followed by copies into further temporaries and i
+        i, e = stmts[n].var, stmts[n].exp
+        while isinstance(e, Var) and n > 0 and isinstance(stmts[n - 1], Assign) \
+                and stmts[n - 1].var == e.name:
+            n -= 1
+            e = stmts[n].exp
+        return step_of(e, i)
+
+    def steps(stmts: List[Stmt], found: Dict[str, List[Optional[int]]]):
+        # the step of every assignment in the loop, or None if it isn't one
+        for n, s in enumerate(stmts):
+            match s:
+                case Assign(i, _):
+                    found.setdefault(i, []).append(step_at(stmts, n))
+                case If(_, then_stmts, else_stmts):
+                    steps(then_stmts, found)
+                    steps(else_stmts, found)
+                case While(Begin(condition_stmts, _), body_stmts):
+                    steps(condition_stmts, found)
+                    steps(body_stmts, found)
+
+    def products(stmts: List[Stmt], induction_vars: Set[str], found: Set[Tuple[str, int]]):
+        for s in stmts:
+            match s:
+                case Assign(_, Prim('mult', [Var(i), Constant(c)]) | Prim('mult', [Constant(c), Var(i)])) \
+                        if i in induction_vars and not isinstance(c, bool):
+                    found.add((i, c))
+                case If(_, then_stmts, else_stmts):
+                    products(then_stmts, induction_vars, found)
+                    products(else_stmts, induction_vars, found)
+                case While(Begin(condition_stmts, _), body_stmts):
+                    products(condition_stmts, induction_vars, found)
+                    products(body_stmts, induction_vars, found)
+
+    # ----------------------------------------
+    def rewrite(stmts: List[Stmt], totals: Dict[Tuple[str, int], str]) -> List[Stmt]:
+        new_stmts = []
+        for n, s in enumerate(stmts):
+            match s:
+                case Assign(x, Prim('mult', [Var(i), Constant(c)]) | Prim('mult', [Constant(c), Var(i)])) \
+                        if (i, c) in totals:
+                    new_stmts.append(Assign(x, Var(totals[(i, c)])))
+                    continue
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(condition, rewrite(then_stmts, totals), rewrite(else_stmts, totals)))
+                    continue
+                case While(Begin(condition_stmts, condition_exp), body_stmts):
+                    new_stmts.append(While(Begin(rewrite(condition_stmts, totals), condition_exp),
+                                           rewrite(body_stmts, totals)))
+                    continue
+            new_stmts.append(s)
+
+            # keep every total equal to its product after each step
+            if isinstance(s, Assign) and step_at(stmts, n) is not None:
+                for (i, c), total in totals.items():
+                    if i == s.var:
+                        new_stmts.append(Assign(total, Prim('add', [Var(total), Constant(step_at(stmts, n) * c)])))
+        return new_stmts
+
+    def entry_value(preceding: List[Stmt], i: str) -> Optional[Constant]:
+        # the constant i holds on entry to the loop, if the statements right
+        # before it set one
+        for s in reversed(preceding):
+            match s:
+                case Assign(x, Constant(c)) if x == i:
+                    return Constant(c)
+                case Assign(x, _) if x != i:
+                    continue
+                case _:
+                    return None
+        return None
+
+    def reduce_loop(s: While, preceding: List[Stmt]) -> List[Stmt]:
+        match s:
+            case While(Begin(condition_stmts, condition_exp), body_stmts):
+                loop_steps = {}
+                steps(condition_stmts + body_stmts, loop_steps)
+                induction_vars = {i for i, found in loop_steps.items() if None not in found}
+
+                found = set()
+                products(condition_stmts + body_stmts, induction_vars, found)
+                totals = {(i, c): gensym(i) for i, c in sorted(found)
+                          if all(fits(step * c) for step in loop_steps[i])}
+                if not totals:
+                    return [s]
+
+                reduced.update({total: f'{i} * {c}' for (i, c), total in totals.items()})
+                initial_stmts = []
+                for (i, c), total in totals.items():
+                    match entry_value(preceding, i):
+                        case Constant(v) if fits(v * c):
+                            initial_stmts.append(Assign(total, Constant(v * c)))
+                        case _:
+                            initial_stmts.append(Assign(total, Prim('mult', [Var(i), Constant(c)])))
+                return initial_stmts + \
+                    [While(Begin(rewrite(condition_stmts, totals), condition_exp), rewrite(body_stmts, totals))]
+
+    def reduce_stmts(stmts: List[Stmt]) -> List[Stmt]:
+        # inner loops go first, so their products of an outer loop's
+        # induction variable are reduced by the outer loop too
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case If(condition, then_stmts, else_stmts):
+                    new_stmts.append(If(condition, reduce_stmts(then_stmts), reduce_stmts(else_stmts)))
+                case While(Begin(condition_stmts, condition_exp), body_stmts):
+                    new_stmts += reduce_loop(While(Begin(reduce_stmts(condition_stmts), condition_exp),
+                                                   reduce_stmts(body_stmts)), new_stmts)
+                case FunctionDef(name, params, body_stmts, return_type):
+                    new_stmts.append(FunctionDef(name, params, reduce_stmts(body_stmts), return_type))
+                case _:
+                    new_stmts.append(s)
+        return new_stmts
+
+    match prog:
+        case Program(stmts):
+            new_prog = Program(reduce_stmts(stmts))
+            log('reduced products', reduced)
+            return new_prog
+
+
 ##################################################
 # explicate-control
 ##################################################
@@ -590,12 +1543,29 @@ def _explicate_control(current_function: str, prog: Program) -> cif.CProgram:
             case _:
                 raise Exception('explicate_exp', e)
 
+    def explicate_pred(condition: Expr, then_label: str, else_label: str) -> cif.Stmt:
+        # "not" swaps the branches and constant conditions pick one of them;
+        # the block that can't be reached is removed by simplify-cfg
+        match condition:
+            case Prim('not', [e1]):
+                return explicate_pred(e1, else_label, then_label)
+            case Constant(c):
+                return cif.Goto(then_label if c else else_label)
+            case _:
+                return cif.If(explicate_exp(condition), cif.Goto(then_label), cif.Goto(else_label))
+
     def explicate_stmt(stmt: Stmt, label: str) -> str:
         match stmt:
             case Return(e):
                 new_exp = explicate_exp(e)
                 add_stmt(label, cif.Return(new_exp))
                 return label
+            case Assign(x, Prim('tuple_set', [tup, Constant(i), value])):
+                # stored in place; x names the same tuple afterwards
+                add_stmt(label, cif.TupleSet(explicate_exp(tup), i, explicate_exp(value)))
+                if tup != Var(x):
+                    add_stmt(label, cif.Assign(x, explicate_exp(tup)))
+                return label
             case Assign(x, exp):
                 new_exp = explicate_exp(exp)
                 new_stmt = cif.Assign(x, new_exp)
@@ -617,10 +1587,7 @@ def _explicate_control(current_function: str, prog: Program) -> cif.CProgram:
                 else_continuation = explicate_stmts(else_stmts, else_label)
                 add_stmt(else_continuation, cif.Goto(continuation_label))
 
-                if_stmt = cif.If(explicate_exp(condition),
-                                 cif.Goto(then_label),
-                                 cif.Goto(else_label))
-                add_stmt(label, if_stmt)
+                add_stmt(label, explicate_pred(condition, then_label, else_label))
                 return continuation_label
             case While(Begin(condition_stmts, condition_exp), body_stmts):
                 test_label = create_block()
@@ -631,18 +1598,71 @@ def _explicate_control(current_function: str, prog: Program) -> cif.CProgram:
                 add_stmt(body_continuation, cif.Goto(test_label))
 
                 test_continuation = explicate_stmts(condition_stmts, test_label)
-                add_stmt(test_continuation, cif.If(explicate_exp(condition_exp),
-                                                   cif.Goto(body_label),
-                                                   cif.Goto(continuation_label)))
+                add_stmt(test_continuation, explicate_pred(condition_exp, body_label, continuation_label))
                 add_stmt(label, cif.Goto(test_label))
                 return continuation_label
             case _:
                 raise Exception('explicate_stmt', stmt)
 
 
+    def explicate_allocations(stmts: List[Tuple[str, Expr]], label: str) -> str:
+        # reserve the space for a run of tuple constructions with a single
+        # bounds check, calling the collector only when it doesn't fit, then
+        # carve the tuples out of the reserved space; copies in the run are
+        # kept in place between them
+        total_bytes = sum(8 * (len(e.args) + 1) for _, e in stmts if isinstance(e, Prim))
+        end = gensym('end')
+        continuation_label = create_block()
+        collect_label = create_block()
+
+        add_stmt(label, cif.Assign(end, cif.Prim('add', [cif.GlobalValue('free_ptr'),
+                                                         cif.Constant(total_bytes)])))
+        add_stmt(label, cif.If(cif.Prim('lt', [cif.Var(end), cif.GlobalValue('fromspace_end')]),
+                               cif.Goto(continuation_label),
+                               cif.Goto(collect_label)))
+        add_stmt(collect_label, cif.Collect(total_bytes))
+        add_stmt(collect_label, cif.Goto(continuation_label))
+
+        for x, e in stmts:
+            if not isinstance(e, Prim):
+                add_stmt(continuation_label, cif.Assign(x, explicate_exp(e)))
+                continue
+            add_stmt(continuation_label, cif.Assign(x, cif.Allocate(8 * (len(e.args) + 1),
+                                                                    tuple_var_types[x])))
+            for i, a in enumerate(e.args):
+                add_stmt(continuation_label, cif.TupleSet(cif.Var(x), i, explicate_exp(a)))
+        return continuation_label
+
     def explicate_stmts(stmts: List[Stmt], label: str) -> str:
-        for s in stmts:
-            label = explicate_stmt(s, label)
+        allocations = []
+        tail_position = False
+        for n, s in enumerate(stmts):
+            match s:
+                case Assign(x, Prim('tuple', args)):
+                    allocations.append((x, s.exp))
+                    continue
+                case Assign(x, Var(_) | Constant(_)) if allocations:
+                    # rco copies each new tuple out of its temporary, which
+                    # mustn't end the run
+                    allocations.append((x, s.exp))
+                    continue
+            if allocations:
+                label = explicate_allocations(allocations, label)
+                allocations = []
+
+            match stmts[n:n+2]:
+                case [Assign(x, Call(func, args)), Return(Var(y))] \
+                        if x == y and current_function != 'main':
+                    # a call whose result is returned right away is a tail call
+                    add_stmt(label, cif.TailCall(explicate_exp(func),
+                                                 [explicate_exp(a) for a in args]))
+                    tail_position = True
+                case [Return(_), *_] if tail_position:
+                    tail_position = False
+                case _:
+                    label = explicate_stmt(s, label)
+        if allocations:
+            label = explicate_allocations(allocations, label)
         return label
 
     match prog:
@@ -656,130 +1676,843 @@ def _explicate_control(current_function: str, prog: Program) -> cif.CProgram:
 
 
 ##################################################
-# select-instructions
+# simplify-cfg
 ##################################################
-# op           ::= "add" | "sub" | "mult" | "not" | "or" | "and" | "eq" | "gt" | "gte" | "lt" | "lte"
-#                | "subscript" | "allocate" | "collect" | "tuple_set"
-# Expr         ::= Var(x) | Constant(n) | Prim(op, List[Expr])
-# Stmt         ::= Assign(x, Expr) | Print(Expr)
-#                | If(Expr, Goto(label), Goto(label)) | Goto(label) | Return(Expr)
-# Stmts        ::= List[Stmt]
-# CFunctionDef ::= CFunctionDef(name, List[str], Dict[label, Stmts])
-# Cif         ::= CProgram(List[CFunctionDef])
 
-@dataclass(frozen=True, eq=True)
-class X86FunctionDef(AST):
-    label: str
-    blocks: Dict[str, List[x86.Instr]]
-    stack_space: Tuple[int, int]
-
-@dataclass(frozen=True, eq=True)
-class X86ProgramDefs(AST):
-    defs: List[X86FunctionDef]
-
-def select_instructions(prog: cif.CProgram) -> X86ProgramDefs:
+def simplify_cfg(prog: cif.CProgram) -> cif.CProgram:
     """
-    Transforms a Lfun program into a pseudo-x86 assembly program.
-    :param prog: a Lfun program
-    :return: a pseudo-x86 program
+    Cleans up the control-flow graph of each function: threads jumps
+    through blocks that only jump, merges straight-line blocks and removes
+    unreachable ones.
+    :param prog: A Cif program
+    :return: An equivalent Cif program with fewer blocks
     """
 
-    function_defs = []
-
     match prog:
         case cif.CProgram(defs):
+            new_defs = []
             for d in defs:
                 match d:
                     case cif.CFunctionDef(name, args, blocks):
-                        p = _select_instructions(name, cif.CProgram(blocks))
-                        match p:
-                            case x86.X86Program(new_blocks):
-                                setup_instrs = [x86.Movq(x86.Reg(r), x86.Var(a)) \
-                                                for a, r in zip(args, constants.argument_registers)]
-                                new_blocks[name + 'start'] = setup_instrs + new_blocks[name + 'start']
-
-                                function_defs.append(X86FunctionDef(name, new_blocks, None))
-            return X86ProgramDefs(function_defs)
+                        new_defs.append(cif.CFunctionDef(name, args, _simplify_cfg(name, blocks)))
+            return cif.CProgram(new_defs)
 
 
-def _select_instructions(current_function: str, prog: cif.CProgram) -> x86.X86Program:
+def _simplify_cfg(current_function: str, blocks: Dict[str, List[cif.Stmt]]) -> Dict[str, List[cif.Stmt]]:
     """
-    Transforms a Cif program into a pseudo-x86 assembly program.
-    :param prog: a Cif program
-    :return: a pseudo-x86 program
+    Cleans up the control-flow graph of one function.
+    :param blocks: The basic blocks of the function.
+    :return: The simplified basic blocks.
     """
+    start = current_function + 'start'
 
-    def mk_tag(types: Tuple[type]) -> int:
-        """
-        Builds a vector tag. See section 5.2.2 in the textbook.
-        :param types: A list of the types of the vector's elements.
-        :return: A vector tag, as an integer.
-        """
-        pointer_mask = 0
-        # for each type in the vector, encode it in the pointer mask
-        for t in reversed(types):
-            # shift the mask by 1 bit to make room for this type
-            pointer_mask = pointer_mask << 1
+    def is_terminator(s: cif.Stmt) -> bool:
+        return isinstance(s, (cif.Goto, cif.If, cif.Return, cif.TailCall))
 
-            if isinstance(t, tuple):
-                # if it's a vector type, the mask is 1
-                pointer_mask = pointer_mask + 1
-            else:
-                # otherwise, the mask is 0 (do nothing)
-                pass
+    def targets(stmts: List[cif.Stmt]) -> List[str]:
+        match stmts[-1:]:
+            case [cif.Goto(label)]:
+                return [label]
+            case [cif.If(_, cif.Goto(then_label), cif.Goto(else_label))]:
+                return [then_label, else_label]
+            case _:
+                return []
+
+    # statements after a block's first jump or return never run
+    new_blocks = {}
+    for label, stmts in blocks.items():
+        ends = [n for n, s in enumerate(stmts) if is_terminator(s)]
+        new_blocks[label] = stmts[:ends[0] + 1] if ends else stmts
+
+    # thread jumps through blocks that contain nothing but a goto
+    def thread(label: str) -> str:
+        seen = set()
+        while label not in seen and new_blocks.get(label, [])[:1] == new_blocks.get(label) \
+                and isinstance(new_blocks[label][0], cif.Goto):
+            seen.add(label)
+            label = new_blocks[label][0].label
+        return label
 
-        # shift the pointer mask by 6 bits to make room for the length field
-        mask_and_len = pointer_mask << 6
-        mask_and_len = mask_and_len + len(types) # add the length
+    def retarget(stmts: List[cif.Stmt]) -> List[cif.Stmt]:
+        match stmts[-1:]:
+            case [cif.Goto(label)]:
+                return stmts[:-1] + [cif.Goto(thread(label))]
+            case [cif.If(e, cif.Goto(then_label), cif.Goto(else_label))]:
+                then_label, else_label = thread(then_label), thread(else_label)
+                if then_label == else_label:
+                    return stmts[:-1] + [cif.Goto(then_label)]
+                return stmts[:-1] + [cif.If(e, cif.Goto(then_label), cif.Goto(else_label))]
+            case _:
+                return stmts
+
+    new_blocks = {label: retarget(stmts) for label, stmts in new_blocks.items()}
+
+    # merge a block into its predecessor when that is its only one and it
+    # ends by jumping straight to it
+    merged = True
+    while merged:
+        merged = False
+        predecessors = {label: [] for label in new_blocks}
+        for label, stmts in new_blocks.items():
+            for t in targets(stmts):
+                predecessors[t].append(label)
+        for label, stmts in new_blocks.items():
+            match stmts[-1:]:
+                case [cif.Goto(succ)] if succ != label and succ != start and \
+                        predecessors[succ] == [label]:
+                    new_blocks[label] = stmts[:-1] + new_blocks[succ]
+                    del new_blocks[succ]
+                    merged = True
+                    break
+
+    # drop the blocks that can no longer be reached
+    reachable = set()
+    worklist = [start]
+    while worklist:
+        label = worklist.pop()
+        if label not in reachable:
+            reachable.add(label)
+            worklist.extend(targets(new_blocks[label]))
+
+    return {label: stmts for label, stmts in new_blocks.items() if label in reachable}
 
-        # shift the mask and length by 1 bit to make room for the forwarding bit
-        tag = mask_and_len << 1
-        tag = tag + 1
 
-        return tag
+##################################################
+# value-numbering
+##################################################
 
-    def si_expr(a: cif.Expr) -> x86.Arg:
-        match a:
-            case cif.Constant(i):
-                return x86.Immediate(int(i))
+# the state at a point in a chain of blocks: the value number held by each
+# variable, the value number of each computation, a variable holding each
+# value, and the values that are tuples allocated in the chain
+@dataclass
+class Numbering:
+    var_values: Dict[str, Any]
+    exp_values: Dict[Tuple, Any]
+    holders: Dict[Any, str]
+    fresh_tuples: Set[Any]
 
-            case cif.Var(x):
-                # if x is one of this function’s parameters, return its arg‐reg
-                params = function_params.get(current_function, [])
-                if x in params:
-                    idx = params.index(x)
-                    reg_name = constants.argument_registers[idx]
-                    return x86.Reg(reg_name)
-                # otherwise keep it as a Var
-                return x86.Var(x)
+    def copy(self) -> 'Numbering':
+        return Numbering(self.var_values.copy(), self.exp_values.copy(),
+                         self.holders.copy(), self.fresh_tuples.copy())
 
-            case cif.Prim('subscript', [arr, cif.Constant(idx)]):
-                base = si_expr(arr)
-                offset = 8 * (int(idx) + 1)
-                
-                if isinstance(base, x86.Reg):
-                    return x86.Deref(base.val, offset)
-                elif isinstance(base, x86.Var):
-                    return x86.Deref('r11', offset)
-                else:
-                    return x86.Deref(base, offset)
+def number_values(prog: cif.CProgram) -> cif.CProgram:
+    """
+    Gives every value computed in a chain of blocks a number, so that an
+    operation or field read that was already computed, from the same inputs,
+    becomes a copy of the earlier result. Each chain starts at a block with
+    several predecessors and continues into its successors that have no
+    other predecessor.
+    :param prog: A Cif program
+    :return: An equivalent Cif program
+    """
 
-            case _:
-                raise Exception('si_expr', a)
+    match prog:
+        case cif.CProgram(defs):
+            new_defs = []
+            for d in defs:
+                match d:
+                    case cif.CFunctionDef(name, args, blocks):
+                        new_defs.append(cif.CFunctionDef(name, args, _number_values(name, blocks)))
+            return cif.CProgram(new_defs)
+
+
+def _number_values(current_function: str, blocks: Dict[str, List[cif.Stmt]]) -> Dict[str, List[cif.Stmt]]:
+    """
+    Numbers the values of one function.
+    :param blocks: The basic blocks of the function.
+    :return: The basic blocks, with repeated computations replaced by copies.
+    """
+    commutative_ops = {'add', 'mult', 'and', 'or', 'eq'}
+    value_counter = itertools.count()
+
+    # --------------------------------------------------
+    # utilities
+    # --------------------------------------------------
+    def successors(stmts: List[cif.Stmt]) -> List[str]:
+        match stmts[-1:]:
+            case [cif.Goto(label)]:
+                return [label]
+            case [cif.If(_, cif.Goto(then_label), cif.Goto(else_label))]:
+                return [then_label, else_label]
+            case _:
+                return []
+
+    def is_constant_value(v: Any) -> bool:
+        return isinstance(v, tuple)
+
+    def value_of(a: cif.Expr, n: Numbering) -> Any:
+        match a:
+            case cif.Constant(c):
+                # True and 1 compare equal, so the type is part of the number
+                return (type(c), c)
+            case cif.Var(x):
+                if x not in n.var_values:
+                    n.var_values[x] = next(value_counter)
+                    n.holders[n.var_values[x]] = x
+                return n.var_values[x]
+            case _:
+                return next(value_counter)
+
+    def holder_of(v: Any, n: Numbering) -> Optional[str]:
+        x = n.holders.get(v)
+        return x if x is not None and n.var_values.get(x) == v else None
+
+    def fits(c: Any) -> bool:
+        return isinstance(c, bool) or -2**31 <= c < 2**31
+
+    def canonical(a: cif.Expr, n: Numbering) -> cif.Expr:
+        # the same value, through a small constant or its oldest holder
+        match a:
+            case cif.Var(x) if x not in function_names:
+                v = value_of(a, n)
+                if is_constant_value(v) and fits(v[1]):
+                    return cif.Constant(v[1])
+                holder = holder_of(v, n)
+                if holder is not None and holder not in function_names:
+                    return cif.Var(holder)
+        return a
+
+    def assign(x: str, v: Any, n: Numbering):
+        n.var_values[x] = v
+        if not is_constant_value(v) and holder_of(v, n) is None:
+            n.holders[v] = x
+
+    def forget_fields(index: Optional[int], n: Numbering):
+        for key in list(n.exp_values):
+            if key[0] == 'subscript' and (index is None or key[2] == (int, index)):
+                del n.exp_values[key]
+
+    # --------------------------------------------------
+    # numbering
+    # --------------------------------------------------
+    def nv_stmt(s: cif.Stmt, n: Numbering) -> cif.Stmt:
+        match s:
+            case cif.Assign(x, cif.Prim('result', _) as e):
+                # each call produces new results
+                assign(x, next(value_counter), n)
+                return cif.Assign(x, e)
+            case cif.Assign(x, cif.Prim(op, args)):
+                new_args = [canonical(a, n) for a in args]
+                values = [value_of(a, n) for a in new_args]
+                if op in commutative_ops:
+                    values = sorted(values, key=repr)
+                key = (op, *values)
+                if key in n.exp_values:
+                    v = n.exp_values[key]
+                    holder = holder_of(v, n)
+                    if is_constant_value(v) and fits(v[1]):
+                        assign(x, v, n)
+                        return cif.Assign(x, cif.Constant(v[1]))
+                    elif holder is not None:
+                        assign(x, v, n)
+                        return cif.Assign(x, cif.Var(holder))
+                else:
+                    v = next(value_counter)
+                    n.exp_values[key] = v
+                assign(x, v, n)
+                return cif.Assign(x, cif.Prim(op, new_args))
+            case cif.Assign(x, cif.Allocate(_, _) as e):
+                v = next(value_counter)
+                n.fresh_tuples.add(v)
+                assign(x, v, n)
+                return cif.Assign(x, e)
+            case cif.Assign(x, cif.Call(func, args)):
+                # the callee may store into any tuple it can reach, and keep
+                # the tuples it is passed
+                forget_fields(None, n)
+                new_args = [canonical(a, n) for a in args]
+                n.fresh_tuples.difference_update(value_of(a, n) for a in new_args)
+                new_s = cif.Assign(x, cif.Call(func, new_args))
+                assign(x, next(value_counter), n)
+                return new_s
+            case cif.Assign(x, e):
+                new_e = canonical(e, n)
+                assign(x, value_of(new_e, n), n)
+                return cif.Assign(x, new_e)
+            case cif.TupleSet(tup, index, value):
+                new_tup, new_value = canonical(tup, n), canonical(value, n)
+                v = value_of(new_tup, n)
+                if v not in n.fresh_tuples:
+                    # the tuple may be reachable through other names too
+                    forget_fields(index, n)
+                # once stored, a fresh tuple can be reached through the other one
+                n.fresh_tuples.discard(value_of(new_value, n))
+                n.exp_values[('subscript', v, (int, index))] = value_of(new_value, n)
+                return cif.TupleSet(new_tup, index, new_value)
+            case cif.Print(e):
+                return cif.Print(canonical(e, n))
+            case cif.Return(cif.Prim('values', args)):
+                return cif.Return(cif.Prim('values', [canonical(a, n) for a in args]))
+            case cif.Return(e):
+                return cif.Return(canonical(e, n))
+            case cif.TailCall(func, args):
+                return cif.TailCall(func, [canonical(a, n) for a in args])
+            case cif.If(cif.Prim(op, args), then_branch, else_branch):
+                return cif.If(cif.Prim(op, [canonical(a, n) for a in args]), then_branch, else_branch)
+            case cif.If(e, then_branch, else_branch):
+                return cif.If(canonical(e, n), then_branch, else_branch)
+            case _:
+                return s
+
+    # --------------------------------------------------
+    # main body of the pass
+    # --------------------------------------------------
+    predecessors = {label: 0 for label in blocks}
+    predecessors[current_function + 'start'] = 1
+    for stmts in blocks.values():
+        for label in successors(stmts):
+            predecessors[label] += 1
+
+    new_blocks = dict(blocks)
+
+    def nv_chain(label: str, n: Numbering):
+        new_blocks[label] = [nv_stmt(s, n) for s in blocks[label]]
+        for succ in successors(blocks[label]):
+            if predecessors[succ] == 1 and succ != current_function + 'start':
+                nv_chain(succ, n.copy())
+
+    for label in blocks:
+        if predecessors[label] != 1 or label == current_function + 'start':
+            nv_chain(label, Numbering({}, {}, {}, set()))
+
+    return new_blocks
+
+
+##################################################
+# preallocate-constants
+##################################################
+
+def preallocate_constants(prog: cif.CProgram) -> cif.CProgram:
+    """
+    Replaces tuples built only from constants, that are only ever read, with
+    preinitialized objects in the data section. The collector must never
+    reach such an object, so every variable that may hold one (the tuple's
+    own, and the parameters it is passed to) is recorded in
+    `unrooted_pointers` and never saved to the root stack. A parameter only
+    qualifies when it is not live across a collection, since other callers
+    may pass it a heap tuple.
+    :param prog: A Cif program
+    :return: An equivalent Cif program
+    """
+    unrooted_pointers.clear()
+
+    match prog:
+        case cif.CProgram(defs):
+            # parameters are assumed safe to receive a constant tuple until a
+            # body shows otherwise
+            safe_params = {d.name: set(range(len(d.args))) for d in defs}
+            changed = True
+            while changed:
+                safe_vars = {d.name: _constant_tuple_holders(d.args, d.blocks, safe_params) for d in defs}
+                new_safe_params = {d.name: {k for k, p in enumerate(d.args) if p in safe_vars[d.name]}
+                                   for d in defs}
+                changed = new_safe_params != safe_params
+                safe_params = new_safe_params
+
+            new_defs = []
+            for d in defs:
+                match d:
+                    case cif.CFunctionDef(name, args, blocks):
+                        unrooted_pointers[name] = safe_vars[name]
+                        new_defs.append(cif.CFunctionDef(name, args,
+                                                         _preallocate_constants(blocks, safe_vars[name])))
+            log('unrooted pointers', unrooted_pointers)
+            return cif.CProgram(new_defs)
+
+
+def _constant_tuple_holders(args: List[str], blocks: Dict[str, List[cif.Stmt]],
+                            safe_params: Dict[str, Set[int]]) -> Set[str]:
+    """
+    Finds the variables of one function that may hold a preallocated tuple:
+    parameters, and tuples whose fields are all set to constants right after
+    they are allocated, that are never assigned otherwise, only have their
+    fields read or are passed to parameters that are safe themselves, and
+    for parameters, are never live across a call that may collect.
+    :param args: The parameters of the function.
+    :param blocks: The basic blocks of the function.
+    :param safe_params: For each function, the positions of the parameters
+    that may receive a preallocated tuple.
+    :return: The variables that may hold a preallocated tuple.
+    """
+
+    # --------------------------------------------------
+    # utilities
+    # --------------------------------------------------
+    def vars_exp(e: cif.Expr) -> Set[str]:
+        match e:
+            case cif.Var(x):
+                return {x}
+            case cif.Prim(_, args):
+                return set().union(*[vars_exp(a) for a in args])
+            case cif.Call(func, args):
+                return vars_exp(func).union(*[vars_exp(a) for a in args])
+            case _:
+                return set()
+
+    def reads_of(s: cif.Stmt) -> Set[str]:
+        match s:
+            case cif.Assign(_, e) | cif.Print(e) | cif.Return(e) | cif.If(e, _, _):
+                return vars_exp(e)
+            case cif.TupleSet(tup, _, value):
+                return vars_exp(tup).union(vars_exp(value))
+            case cif.TailCall(func, args):
+                return vars_exp(func).union(*[vars_exp(a) for a in args])
+            case _:
+                return set()
+
+    def successors(stmts: List[cif.Stmt]) -> List[str]:
+        match stmts[-1:]:
+            case [cif.Goto(label)]:
+                return [label]
+            case [cif.If(_, cif.Goto(then_label), cif.Goto(else_label))]:
+                return [then_label, else_label]
+            case _:
+                return []
+
+    def may_collect(s: cif.Stmt) -> bool:
+        return isinstance(s, cif.Collect) or \
+            (isinstance(s, cif.Assign) and isinstance(s.exp, cif.Call))
+
+    # --------------------------------------------------
+    # candidates
+    # --------------------------------------------------
+    allocations: Dict[str, Tuple[cif.Allocate, List[int]]] = {}
+    copies: Dict[str, Set[str]] = {}
+    other_defs = set(args)
+    for stmts in blocks.values():
+        for s in stmts:
+            match s:
+                case cif.Assign(x, cif.Allocate(_, _) as e) if x not in allocations:
+                    allocations[x] = (e, [])
+                case cif.Assign(x, cif.Var(y)):
+                    copies.setdefault(x, set()).add(y)
+                case cif.Assign(x, _):
+                    other_defs.add(x)
+                case cif.TupleSet(cif.Var(x), i, cif.Constant(_)) if x in allocations:
+                    allocations[x][1].append(i)
+
+    # each field must be set exactly once, so the tuple is never mutated
+    candidates = {x for x, (e, fields) in allocations.items()
+                  if sorted(fields) == list(range(len(e.tuple_type))) and x not in copies}
+    # a copy of a constant tuple may hold it too, but a copy of a parameter
+    # is left alone since it could hold a heap tuple
+    candidates |= {x for x in copies if x not in allocations}
+    candidates -= other_defs
+
+    def unsafe_reads(s: cif.Stmt) -> Set[str]:
+        # the variables s reads other than by reading a field, initializing
+        # a constant tuple, copying it to another candidate, or passing it to
+        # a safe parameter
+        match s:
+            case cif.Assign(_, cif.Prim('subscript', [cif.Var(_), cif.Constant(_)])):
+                return set()
+            case cif.TupleSet(cif.Var(x), _, cif.Constant(_)) if x in allocations:
+                return set()
+            case cif.Assign(x, cif.Var(_)) if x in candidates:
+                return set()
+            case cif.Assign(_, cif.Call(cif.Var(f), call_args)) | cif.TailCall(cif.Var(f), call_args) \
+                    if f in safe_params:
+                return set().union(*[vars_exp(a) for k, a in enumerate(call_args) if k not in safe_params[f]])
+            case _:
+                return reads_of(s)
+
+    candidates |= set(args)
+    changed = True
+    while changed:
+        old_candidates = candidates.copy()
+        for stmts in blocks.values():
+            for s in stmts:
+                candidates -= unsafe_reads(s)
+        candidates -= {x for x, sources in copies.items() if not sources <= candidates - set(args)}
+        changed = old_candidates != candidates
+
+    # --------------------------------------------------
+    # liveness: a preallocated tuple never moves, but a parameter may also
+    # receive a heap tuple, which must be rooted if it is live across a
+    # collection
+    # --------------------------------------------------
+    live_before_sets = {label: set() for label in blocks}
+    rooted = set()
+
+    def ul_block(label: str):
+        live = set().union(*[live_before_sets[l] for l in successors(blocks[label])])
+        for s in reversed(blocks[label]):
+            if may_collect(s):
+                rooted.update(live & candidates)
+            live = live.difference({s.var} if isinstance(s, cif.Assign) else set()).union(reads_of(s))
+        live_before_sets[label] = live
+
+    fixpoint_reached = False
+    while not fixpoint_reached:
+        old_live_befores = live_before_sets.copy()
+        for label in reversed(list(blocks.keys())):
+            ul_block(label)
+        fixpoint_reached = old_live_befores == live_before_sets
+
+    return candidates - (rooted & set(args))
+
+
+def _preallocate_constants(blocks: Dict[str, List[cif.Stmt]], holders: Set[str]) \
+        -> Dict[str, List[cif.Stmt]]:
+    """
+    Takes the constant tuples of one function from the data section.
+    :param blocks: The basic blocks of the function.
+    :param holders: The variables that may hold a preallocated tuple.
+    :return: The basic blocks, with constant tuples taken from the data section.
+    """
+    fields = {}
+    for stmts in blocks.values():
+        for s in stmts:
+            match s:
+                case cif.TupleSet(cif.Var(x), i, c) if x in holders:
+                    fields.setdefault(x, {})[i] = c
+
+    new_blocks = {}
+    for label, stmts in blocks.items():
+        new_stmts = []
+        for s in stmts:
+            match s:
+                case cif.Assign(x, cif.Allocate(_, tuple_type)) if x in holders:
+                    values = [fields[x][i] for i in range(len(tuple_type))]
+                    new_stmts.append(cif.Assign(x, cif.StaticTuple(values, tuple_type)))
+                case cif.TupleSet(cif.Var(x), _, _) if x in holders:
+                    pass
+                case _:
+                    new_stmts.append(s)
+        new_blocks[label] = new_stmts
+    return new_blocks
+
+
+##################################################
+# eliminate-dead-code
+##################################################
+
+def eliminate_dead_code(prog: cif.CProgram) -> cif.CProgram:
+    """
+    Deletes assignments whose results are never read, including tuples that
+    are allocated and initialized but never used, so they never reach
+    instruction selection or the register allocator.
+    :param prog: A Cif program
+    :return: An equivalent Cif program
+    """
+
+    match prog:
+        case cif.CProgram(defs):
+            new_defs = []
+            for d in defs:
+                match d:
+                    case cif.CFunctionDef(name, args, blocks):
+                        new_defs.append(cif.CFunctionDef(name, args, _eliminate_dead_code(name, args, blocks)))
+            return cif.CProgram(new_defs)
+
+
+def _eliminate_dead_code(current_function: str, params: List[str], blocks: Dict[str, List[cif.Stmt]]) \
+        -> Dict[str, List[cif.Stmt]]:
+    """
+    Deletes the dead assignments of one function, using a liveness analysis
+    over its basic blocks, and shrinks the heap checks of the tuples that are
+    left.
+    :param params: The parameters of the function.
+    :param blocks: The basic blocks of the function.
+    :return: The basic blocks, without dead assignments.
+    """
+    live_before_sets: Dict[str, Set[str]] = {label: set() for label in blocks}
+
+    # --------------------------------------------------
+    # utilities
+    # --------------------------------------------------
+    def vars_exp(e: cif.Expr) -> Set[str]:
+        match e:
+            case cif.Var(x):
+                return {x}
+            case cif.Prim(_, args):
+                return set().union(*[vars_exp(a) for a in args])
+            case cif.Call(func, args):
+                return vars_exp(func).union(*[vars_exp(a) for a in args])
+            case _:
+                return set()
+
+    def is_pure(e: cif.Expr) -> bool:
+        return not isinstance(e, cif.Call)
+
+    # a tuple that is copied, passed or returned may be read through another
+    # name, and so may one that wasn't allocated here, so stores into it
+    # always count as uses
+    escaping = set()
+
+    def find_escaping():
+        escaping.clear()
+        escaping.update(params)
+        for stmts in blocks.values():
+            for s in stmts:
+                if isinstance(s, cif.Assign) and not isinstance(s.exp, cif.Allocate):
+                    escaping.add(s.var)
+                match s:
+                    case cif.Assign(_, cif.Var(x)) | cif.TupleSet(_, _, cif.Var(x)) | cif.Return(cif.Var(x)):
+                        escaping.add(x)
+                    case cif.Assign(_, cif.Call(func, args)) | cif.TailCall(func, args):
+                        escaping.update(vars_exp(func).union(*[vars_exp(a) for a in args]))
+
+    def is_dead(s: cif.Stmt, live_after: Set[str]) -> bool:
+        match s:
+            case cif.Assign(x, e):
+                return x not in live_after and is_pure(e)
+            case cif.TupleSet(cif.Var(x), _, _):
+                return x not in live_after and x not in escaping
+            case _:
+                return False
+
+    def reads_of(s: cif.Stmt) -> Set[str]:
+        match s:
+            case cif.Assign(_, e) | cif.Print(e) | cif.Return(e):
+                return vars_exp(e)
+            case cif.TupleSet(tup, _, value):
+                return vars_exp(tup).union(vars_exp(value))
+            case cif.TailCall(func, args):
+                return vars_exp(func).union(*[vars_exp(a) for a in args])
+            case cif.If(test, cif.Goto(then_label), cif.Goto(else_label)):
+                return vars_exp(test).union(live_before_sets[then_label], live_before_sets[else_label])
+            case cif.Goto(label):
+                return live_before_sets[label]
+            case _:
+                return set()
+
+    def writes_of(s: cif.Stmt) -> Set[str]:
+        match s:
+            case cif.Assign(x, _):
+                return {x}
+            case _:
+                return set()
+
+    # --------------------------------------------------
+    # liveness analysis
+    # --------------------------------------------------
+    def ul_stmt(s: cif.Stmt, live_after: Set[str]) -> Set[str]:
+        if is_dead(s, live_after):
+            # a dead statement doesn't make its operands live
+            return live_after
+        return live_after.difference(writes_of(s)).union(reads_of(s))
+
+    def ul_block(label: str):
+        current_live_after: Set[str] = set()
+        for s in reversed(blocks[label]):
+            current_live_after = ul_stmt(s, current_live_after)
+        live_before_sets[label] = current_live_after
+
+    def ul_fixpoint():
+        fixpoint_reached = False
+        while not fixpoint_reached:
+            old_live_befores = live_before_sets.copy()
+            for label in reversed(list(blocks.keys())):
+                ul_block(label)
+            if old_live_befores == live_before_sets:
+                fixpoint_reached = True
+
+    def remove_dead(stmts: List[cif.Stmt]) -> List[cif.Stmt]:
+        new_stmts = []
+        current_live_after: Set[str] = set()
+        for s in reversed(stmts):
+            if not is_dead(s, current_live_after):
+                new_stmts.append(s)
+            current_live_after = ul_stmt(s, current_live_after)
+        return list(reversed(new_stmts))
+
+    # --------------------------------------------------
+    # heap checks
+    # --------------------------------------------------
+    def trim_heap_checks(new_blocks: Dict[str, List[cif.Stmt]]):
+        # a heap check reserves space for the run of allocations at the start
+        # of its continuation block; reserve only what is still allocated
+        # there, and skip the check entirely when nothing is
+        for label, stmts in new_blocks.items():
+            match stmts:
+                case [*_, cif.Assign(end, cif.Prim('add', [cif.GlobalValue('free_ptr'), cif.Constant(_)])),
+                      cif.If(cif.Prim('lt', [cif.Var(end2), cif.GlobalValue('fromspace_end')]),
+                             cif.Goto(continuation_label), cif.Goto(collect_label))] \
+                        if end == end2 and new_blocks[collect_label][:1] != [] \
+                        and isinstance(new_blocks[collect_label][0], cif.Collect):
+                    num_bytes = sum(s.exp.num_bytes for s in new_blocks[continuation_label]
+                                    if isinstance(s, cif.Assign) and isinstance(s.exp, cif.Allocate))
+                    if num_bytes == 0:
+                        new_blocks[label] = stmts[:-2] + [cif.Goto(continuation_label)]
+                    else:
+                        new_blocks[label] = stmts[:-2] + [
+                            cif.Assign(end, cif.Prim('add', [cif.GlobalValue('free_ptr'),
+                                                             cif.Constant(num_bytes)])),
+                            stmts[-1]]
+                        new_blocks[collect_label] = [cif.Collect(num_bytes)] + new_blocks[collect_label][1:]
+
+        # the collect blocks of skipped checks can no longer be reached
+        reachable = set()
+        worklist = [current_function + 'start']
+        while worklist:
+            label = worklist.pop()
+            if label not in reachable:
+                reachable.add(label)
+                match new_blocks[label][-1:]:
+                    case [cif.Goto(target)]:
+                        worklist.append(target)
+                    case [cif.If(_, cif.Goto(then_label), cif.Goto(else_label))]:
+                        worklist += [then_label, else_label]
+        for label in set(new_blocks) - reachable:
+            del new_blocks[label]
+
+    # --------------------------------------------------
+    # main body of the pass
+    # --------------------------------------------------
+    # deleting a copy can stop a tuple from escaping, and skipping a heap
+    # check leaves its bound dead, so repeat until nothing more is removed
+    changed = True
+    while changed:
+        find_escaping()
+        ul_fixpoint()
+        new_blocks = {label: remove_dead(stmts) for label, stmts in blocks.items()}
+        trim_heap_checks(new_blocks)
+        changed = new_blocks != blocks
+        blocks = new_blocks
+        live_before_sets.clear()
+        live_before_sets.update({label: set() for label in blocks})
+
+    return blocks
+
+
+##################################################
+# select-instructions
+##################################################
+# op           ::= "add" | "sub" | "mult" | "not" | "or" | "and" | "eq" | "gt" | "gte" | "lt" | "lte"
+#                | "subscript" | "allocate" | "collect" | "tuple_set"
+# Expr         ::= Var(x) | Constant(n) | Prim(op, List[Expr])
+# Stmt         ::= Assign(x, Expr) | Print(Expr)
+#                | If(Expr, Goto(label), Goto(label)) | Goto(label) | Return(Expr)
+# Stmts        ::= List[Stmt]
+# CFunctionDef ::= CFunctionDef(name, List[str], Dict[label, Stmts])
+# Cif         ::= CProgram(List[CFunctionDef])
+
+@dataclass(frozen=True, eq=True)
+class X86FunctionDef(AST):
+    label: str
+    blocks: Dict[str, List[x86.Instr]]
+    stack_space: Tuple[int, int]
+
+@dataclass(frozen=True, eq=True)
+class X86ProgramDefs(AST):
+    defs: List[X86FunctionDef]
+
+def select_instructions(prog: cif.CProgram) -> X86ProgramDefs:
+    """
+    Transforms a Lfun program into a pseudo-x86 assembly program.
+    :param prog: a Lfun program
+    :return: a pseudo-x86 program
+    """
+
+    function_defs = []
+
+    match prog:
+        case cif.CProgram(defs):
+            for d in defs:
+                match d:
+                    case cif.CFunctionDef(name, args, blocks):
+                        p = _select_instructions(name, cif.CProgram(blocks))
+                        match p:
+                            case x86.X86Program(new_blocks):
+                                setup_instrs = [x86.Movq(x86.Reg(r), x86.Var(a)) \
+                                                for a, r in zip(args, constants.argument_registers)]
+                                new_blocks[name + 'start'] = setup_instrs + new_blocks[name + 'start']
+
+                                function_defs.append(X86FunctionDef(name, new_blocks, None))
+            return X86ProgramDefs(function_defs)
+
+
+def _select_instructions(current_function: str, prog: cif.CProgram) -> x86.X86Program:
+    """
+    Transforms a Cif program into a pseudo-x86 assembly program.
+    :param prog: a Cif program
+    :return: a pseudo-x86 program
+    """
+
+    def mk_tag(types: Tuple[type]) -> int:
+        """
+        Builds a vector tag. See section 5.2.2 in the textbook.
+        :param types: A list of the types of the vector's elements.
+        :return: A vector tag, as an integer.
+        """
+        pointer_mask = 0
+        # for each type in the vector, encode it in the pointer mask
+        for t in reversed(types):
+            # shift the mask by 1 bit to make room for this type
+            pointer_mask = pointer_mask << 1
+
+            if isinstance(t, tuple):
+                # if it's a vector type, the mask is 1
+                pointer_mask = pointer_mask + 1
+            else:
+                # otherwise, the mask is 0 (do nothing)
+                pass
+
+        # shift the pointer mask by 6 bits to make room for the length field
+        mask_and_len = pointer_mask << 6
+        mask_and_len = mask_and_len + len(types) # add the length
+
+        # shift the mask and length by 1 bit to make room for the forwarding bit
+        tag = mask_and_len << 1
+        tag = tag + 1
+
+        return tag
+
+    def si_expr(a: cif.Expr) -> x86.Arg:
+        match a:
+            case cif.Constant(i):
+                return x86.Immediate(int(i))
+
+            case cif.GlobalValue(name):
+                return x86.GlobalVal(name)
+
+            case cif.Var(x):
+                # parameters are copied out of the argument registers at the start
+                # of the function, so they are ordinary variables from here on
+                return x86.Var(x)
+
+            case cif.Prim('subscript', [arr, cif.Constant(idx)]):
+                base = si_expr(arr)
+                offset = 8 * (int(idx) + 1)
+                
+                if isinstance(base, x86.Reg):
+                    return x86.Deref(base.val, offset)
+                elif isinstance(base, x86.Var):
+                    return x86.Deref('r11', offset)
+                else:
+                    return x86.Deref(base, offset)
+
+            case _:
+                raise Exception('si_expr', a)
 
 
     def si_stmts(stmts: List[cif.Stmt]) -> List[x86.Instr]:
         instrs = []
 
+        # r11 still points at a freshly allocated tuple while its fields are
+        # being initialized, so it doesn't need to be reloaded for each one
+        in_r11 = None
         for stmt in stmts:
-            instrs.extend(si_stmt(stmt))
+            match stmt:
+                case cif.TupleSet(cif.Var(x), idx, atm) if x == in_r11:
+                    instrs.append(x86.Movq(si_expr(atm), x86.Deref('r11', 8*(idx+1))))
+                case cif.Assign(x, cif.Allocate(_, _)) | cif.TupleSet(cif.Var(x), _, _):
+                    instrs.extend(si_stmt(stmt))
+                    in_r11 = x
+                case _:
+                    instrs.extend(si_stmt(stmt))
+                    in_r11 = None
 
         return instrs
 
     op_cc = {'eq': 'e', 'gt': 'g', 'gte': 'ge', 'lt': 'l', 'lte': 'le'}
+    swapped_cc = {'e': 'e', 'g': 'l', 'ge': 'le', 'l': 'g', 'le': 'ge'}
 
     binop_instrs = {'add': x86.Addq, 'sub': x86.Subq, 'mult': x86.Imulq,
                     'and': x86.Andq, 'or': x86.Orq}
+    commutative_ops = {'add', 'mult', 'and', 'or'}
+    result_registers = ['rax', 'rdx']
 
     def si_stmt(stmt: cif.Stmt) -> List[x86.Instr]:
         match stmt:
@@ -788,11 +2521,8 @@ def _select_instructions(current_function: str, prog: cif.CProgram) -> x86.X86Pr
             case cif.Assign(x, cif.Call(fun, args)):
                 instrs = []
 
-                # save caller-saved registers
-                for r in constants.caller_saved_registers:
-                    instrs += [x86.Pushq(x86.Reg(r))]
-
-                # place arguments in argument registers
+                # place arguments in argument registers; the register allocator
+                # saves whichever caller-saved registers are live across the call
                 for a, r in zip(args, constants.argument_registers):
                     instrs += [x86.Movq(si_expr(a), x86.Reg(r))]
 
@@ -801,34 +2531,61 @@ def _select_instructions(current_function: str, prog: cif.CProgram) -> x86.X86Pr
                     case cif.Var(f) if f in function_names:
                         instrs += [x86.Callq(f)]
                     case _:
-                        instrs += [x86.IndirectCallq(si_expr(fun), 0)]
-
-                # restore caller-saved registers
-                for r in reversed(constants.caller_saved_registers):
-                    instrs += [x86.Popq(x86.Reg(r))]
+                        instrs += [x86.IndirectCallq(si_expr(fun), len(args))]
 
                 # move the result from rax into the destination
                 instrs += [x86.Movq(x86.Reg('rax'), x86.Var(x))]
                 return instrs
-            case cif.Assign(x, cif.Prim('tuple', args)):
-                tag = mk_tag(tuple_var_types[x])
-                instrs = [x86.Movq(x86.Immediate(8*(1+len(args))), x86.Reg('rdi')),
-                          x86.Callq('allocate'),
-                          x86.Movq(x86.Reg('rax'), x86.Reg('r11')),
-                          x86.Movq(x86.Immediate(tag), x86.Deref('r11', 0))]
-                for i, a in enumerate(args):
-                    instrs.append(x86.Movq(si_expr(a), x86.Deref('r11', 8*(i+1))))
-                instrs.append(x86.Movq(x86.Reg('r11'), x86.Var(x)))
-                return instrs
+            case cif.Assign(x, cif.StaticTuple(values, types)):
+                # identical constant tuples share one object in the data section
+                key = (mk_tag(types), *[int(v.val) for v in values])
+                if key not in static_tuples:
+                    static_tuples[key] = gensym('static_tuple')
+                return [x86.Leaq(x86.GlobalVal(static_tuples[key]), x86.Var(x))]
+            case cif.Assign(x, cif.Allocate(num_bytes, types)):
+                # the space was already reserved, so just bump the pointer
+                return [x86.Movq(x86.GlobalVal('free_ptr'), x86.Reg('r11')),
+                        x86.Addq(x86.Immediate(num_bytes), x86.GlobalVal('free_ptr')),
+                        x86.Movq(x86.Immediate(mk_tag(types)), x86.Deref('r11', 0)),
+                        x86.Movq(x86.Reg('r11'), x86.Var(x))]
+            case cif.TupleSet(tup, idx, atm):
+                return [x86.Movq(si_expr(tup), x86.Reg('r11')),
+                        x86.Movq(si_expr(atm), x86.Deref('r11', 8*(idx+1)))]
+            case cif.Collect(num_bytes):
+                return [x86.Movq(x86.Reg('r15'), x86.Reg('rdi')),
+                        x86.Movq(x86.Immediate(num_bytes), x86.Reg('rsi')),
+                        x86.Callq('collect')]
+            case cif.Assign(x, cif.Prim('result', [_, cif.Constant(idx)])):
+                return [x86.Movq(x86.Reg(result_registers[idx]), x86.Var(x))]
             case cif.Assign(x, cif.Prim('subscript', [atm1, cif.Constant(idx)])):
                 offset_bytes = 8 * (idx + 1)
                 return [x86.Movq(si_expr(atm1), x86.Reg('r11')),
                         x86.Movq(x86.Deref('r11', offset_bytes), x86.Var(x))]
+            case cif.Assign(x, cif.Prim('mult', [atm1, cif.Constant(c)])) | \
+                 cif.Assign(x, cif.Prim('mult', [cif.Constant(c), atm1])) \
+                    if c in [0, 1, 2, 4]:
+                # multiplying by 2 or 4 doubles the destination in place once
+                # or twice, which is cheaper than imulq
+                if c == 0:
+                    return [x86.Movq(x86.Immediate(0), x86.Var(x))]
+                instrs = [] if atm1 == cif.Var(x) else [x86.Movq(si_expr(atm1), x86.Var(x))]
+                return instrs + [x86.Addq(x86.Var(x), x86.Var(x))] * (c.bit_length() - 1)
             case cif.Assign(x, cif.Prim(op, [atm1, atm2])):
                 if op in binop_instrs:
-                    return [x86.Movq(si_expr(atm1), x86.Reg('rax')),
-                            binop_instrs[op](si_expr(atm2), x86.Reg('rax')),
-                            x86.Movq(x86.Reg('rax'), x86.Var(x))]
+                    # operate on the destination directly: in place when it is
+                    # already one of the operands, otherwise after copying the
+                    # first operand into it
+                    if atm1 == cif.Var(x):
+                        return [binop_instrs[op](si_expr(atm2), x86.Var(x))]
+                    elif atm2 == cif.Var(x) and op in commutative_ops:
+                        return [binop_instrs[op](si_expr(atm1), x86.Var(x))]
+                    elif atm2 == cif.Var(x):
+                        return [x86.Movq(si_expr(atm1), x86.Reg('rax')),
+                                binop_instrs[op](si_expr(atm2), x86.Reg('rax')),
+                                x86.Movq(x86.Reg('rax'), x86.Var(x))]
+                    else:
+                        return [x86.Movq(si_expr(atm1), x86.Var(x)),
+                                binop_instrs[op](si_expr(atm2), x86.Var(x))]
                 elif op in op_cc:
                     return [x86.Cmpq(si_expr(atm2), si_expr(atm1)),
                             x86.Set(op_cc[op], x86.ByteReg('al')),
@@ -844,13 +2601,44 @@ def _select_instructions(current_function: str, prog: cif.CProgram) -> x86.X86Pr
             case cif.Print(atm1):
                 return [x86.Movq(si_expr(atm1), x86.Reg('rdi')),
                         x86.Callq('print_int')]
+            case cif.Return(cif.Prim('values', atms)):
+                # an unboxed dataclass result is returned in rax and rdx
+                return [x86.Movq(si_expr(a), x86.Reg(r)) for a, r in zip(atms, result_registers)] + \
+                       [x86.Jmp(current_function + 'conclusion')]
             case cif.Return(atm1):
                 return [x86.Movq(si_expr(atm1), x86.Reg('rax')),
                         x86.Jmp(current_function + 'conclusion')]
+            case cif.TailCall(cif.Var(f), args) if f in function_names:
+                instrs = [x86.Movq(si_expr(a), x86.Reg(r))
+                          for a, r in zip(args, constants.argument_registers)]
+                if f == current_function:
+                    # self tail recursion is a loop back to the start, which
+                    # copies the new arguments into the parameters
+                    return instrs + [x86.Jmp(current_function + 'start')]
+                else:
+                    return instrs + [x86.TailJmp(x86.FunRef(f), len(args))]
+            case cif.TailCall(fun, args):
+                # x86 has no printable indirect jump here, so calls through
+                # a function value stay regular calls
+                tmp = gensym('tmp')
+                return si_stmt(cif.Assign(tmp, cif.Call(fun, args))) + \
+                       si_stmt(cif.Return(cif.Var(tmp)))
             case cif.Goto(label):
                 return [x86.Jmp(label)]
+            case cif.If(cif.Prim(op, [cif.Constant(_) as atm1, atm2]), cif.Goto(then_label),
+                        cif.Goto(else_label)) if op in op_cc and not isinstance(atm2, cif.Constant):
+                # cmpq can't take an immediate as its second operand, so
+                # compare the other way around
+                return [x86.Cmpq(si_expr(atm1), si_expr(atm2)),
+                        x86.JmpIf(swapped_cc[op_cc[op]], then_label),
+                        x86.Jmp(else_label)]
+            case cif.If(cif.Prim(op, [atm1, atm2]), cif.Goto(then_label), cif.Goto(else_label)) \
+                    if op in op_cc:
+                return [x86.Cmpq(si_expr(atm2), si_expr(atm1)),
+                        x86.JmpIf(op_cc[op], then_label),
+                        x86.Jmp(else_label)]
             case cif.If(a, cif.Goto(then_label), cif.Goto(else_label)):
-                return [x86.Cmpq(si_expr(a), x86.Immediate(1)),
+                return [x86.Cmpq(x86.Immediate(1), si_expr(a)),
                         x86.JmpIf('e', then_label),
                         x86.Jmp(else_label)]
             case _:
@@ -864,6 +2652,219 @@ def _select_instructions(current_function: str, prog: cif.CProgram) -> x86.X86Pr
             raise Exception('select_instructions', prog)
 
 
+##################################################
+# schedule-instructions
+##################################################
+
+def schedule_instructions(program: X86ProgramDefs) -> X86ProgramDefs:
+    """
+    Reorders independent instructions within each basic block to reduce the
+    number of variables live at the same time.
+    :param program: A pseudo-x86 program.
+    :return: A pseudo-x86 program with the same behavior.
+    """
+
+    match program:
+        case X86ProgramDefs(defs):
+            new_defs = []
+            for d in defs:
+                new_prog = _schedule_instructions(x86.X86Program(d.blocks))
+                new_defs.append(X86FunctionDef(d.label, new_prog.blocks, d.stack_space))
+            return X86ProgramDefs(new_defs)
+
+
+def _schedule_instructions(program: x86.X86Program) -> x86.X86Program:
+    """
+    List-schedules each block over its dependence graph. Calls and jumps are
+    barriers, so calls, prints and allocations stay in their original order.
+    Among the ready instructions, copies out of incoming registers go first,
+    then the one that frees the most values (and defines the fewest new ones),
+    with ties broken by the original order.
+    :param program: A pseudo-x86 program.
+    :return: A pseudo-x86 program with the same behavior.
+    """
+
+    # a variable mentioned in more than one block may be live out of any of
+    # them, so reading it never frees it
+    blocks_of = {}
+    for label, instrs in program.blocks.items():
+        for i in instrs:
+            for a in getattr(i, '__dict__', {}).values():
+                if isinstance(a, x86.Var):
+                    blocks_of.setdefault(a, set()).add(label)
+    local_vars = {v for v, labels in blocks_of.items() if len(labels) == 1}
+
+    # --------------------------------------------------
+    # dependencies
+    # --------------------------------------------------
+    def arg_reads(a: x86.Arg) -> Set:
+        match a:
+            case x86.Var(_):
+                return {a}
+            case x86.Reg(r) | x86.ByteReg(r):
+                return {x86.Reg('rax' if r == 'al' else r)}
+            case x86.Deref(r, _):
+                return {x86.Reg(r), 'memory'}
+            case x86.GlobalVal(_):
+                return {'memory'}
+            case _:
+                return set()
+
+    def arg_writes(a: x86.Arg) -> Set:
+        match a:
+            case x86.Deref(r, _):
+                return {'memory'}
+            case _:
+                return arg_reads(a)
+
+    def address_reads(a: x86.Arg) -> Set:
+        match a:
+            case x86.Deref(r, _):
+                return {x86.Reg(r)}
+            case _:
+                return set()
+
+    def uses_defs(i: x86.Instr) -> Tuple[Set, Set]:
+        match i:
+            case x86.Movq(a1, a2) | x86.Movzbq(a1, a2):
+                return arg_reads(a1) | address_reads(a2), arg_writes(a2)
+            case x86.Leaq(a1, a2):
+                return address_reads(a1) | address_reads(a2), arg_writes(a2)
+            case x86.Cmpq(a1, a2):
+                return arg_reads(a1) | arg_reads(a2), {'flags'}
+            case x86.Addq(a1, a2) | x86.Subq(a1, a2) | x86.Imulq(a1, a2) | \
+                 x86.Andq(a1, a2) | x86.Orq(a1, a2) | x86.Xorq(a1, a2):
+                return arg_reads(a1) | arg_reads(a2), arg_writes(a2) | {'flags'}
+            case x86.Set(_, a1):
+                return {'flags'} | address_reads(a1), arg_writes(a1)
+            case _:
+                raise Exception('schedule_instructions', i)
+
+    def scratch_writes(i: x86.Instr) -> Set:
+        # patch_instructions routes a compare with an immediate, and any
+        # instruction whose operands may both end up in memory, through rax,
+        # so it must not land between a write of rax (or al) and its reader
+        in_memory = (x86.Var, x86.Deref, x86.GlobalVal)
+        match i:
+            case x86.Cmpq(_, x86.Immediate(_)):
+                return {x86.Reg('rax')}
+            case x86.Imulq(_, a2) if isinstance(a2, in_memory):
+                return {x86.Reg('rax')}
+            case x86.Leaq(_, a2) | x86.Movzbq(x86.ByteReg(_), a2) if isinstance(a2, in_memory):
+                return {x86.Reg('rax')}
+            case x86.Movq(a1, a2) | x86.Movzbq(a1, a2) | x86.Cmpq(a1, a2) | \
+                 x86.Addq(a1, a2) | x86.Subq(a1, a2) | \
+                 x86.Andq(a1, a2) | x86.Orq(a1, a2) | x86.Xorq(a1, a2) \
+                    if isinstance(a1, in_memory) and isinstance(a2, in_memory):
+                return {x86.Reg('rax')}
+            case _:
+                return set()
+
+    def is_barrier(i: x86.Instr) -> bool:
+        return isinstance(i, (x86.Callq, x86.IndirectCallq, x86.Jmp, x86.JmpIf, x86.TailJmp))
+
+    def is_value(r) -> bool:
+        return isinstance(r, (x86.Var, x86.Reg))
+
+    # --------------------------------------------------
+    # list scheduling
+    # --------------------------------------------------
+    def schedule_region(instrs: List[x86.Instr], used_later: Set) -> List[x86.Instr]:
+        """
+        Schedules a run of instructions with no barriers in it. Each value is
+        a location paired with the instruction defining it (-1 when it is
+        defined before the region); a value is freed once its last reader is
+        scheduled, unless it is needed after the region.
+        """
+        uses, defs = zip(*[uses_defs(i) for i in instrs]) if instrs else ([], [])
+        preds = [set() for _ in instrs]
+        last_def = {}
+        readers = {}
+        use_values = []
+        for n in range(len(instrs)):
+            use_values.append({(r, last_def.get(r, -1)) for r in uses[n] if is_value(r)})
+            for r in uses[n]:
+                if r in last_def:
+                    preds[n].add(last_def[r])
+            for r in defs[n] | scratch_writes(instrs[n]):
+                if r in last_def:
+                    preds[n].add(last_def[r])
+                preds[n] |= readers.get(r, set())
+            for r in uses[n]:
+                readers.setdefault(r, set()).add(n)
+            for r in defs[n] | scratch_writes(instrs[n]):
+                last_def[r] = n
+                readers[r] = set()
+
+        succs = [set() for _ in instrs]
+        for n in range(len(instrs)):
+            for p in preds[n]:
+                succs[p].add(n)
+
+        def live_out(value) -> bool:
+            r, d = value
+            return last_def.get(r, -1) == d and \
+                (isinstance(r, x86.Reg) or r not in local_vars or r in used_later)
+
+        pending_readers = {}
+        for values in use_values:
+            for value in values:
+                pending_readers[value] = pending_readers.get(value, 0) + 1
+
+        def pressure(n: int) -> int:
+            born = [r for r in defs[n]
+                    if is_value(r) and ((r, n) in pending_readers or live_out((r, n)))]
+            freed = [value for value in use_values[n]
+                     if pending_readers[value] == 1 and not live_out(value)]
+            return len(born) - len(freed)
+
+        def copies_incoming_register(n: int) -> bool:
+            # parameters and call results are copied out of their registers
+            # right away, so those registers are free for the rest of the region
+            return any(isinstance(r, x86.Reg) and d == -1 for r, d in use_values[n])
+
+        waiting = [len(p) for p in preds]
+        ready = {n for n in range(len(instrs)) if waiting[n] == 0}
+        order = []
+        while ready:
+            n = min(ready, key=lambda n: (not copies_incoming_register(n), pressure(n), n))
+            ready.remove(n)
+            order.append(instrs[n])
+            for value in use_values[n]:
+                pending_readers[value] -= 1
+            for m in succs[n]:
+                waiting[m] -= 1
+                if waiting[m] == 0:
+                    ready.add(m)
+        return order
+
+    def schedule_block(instrs: List[x86.Instr]) -> List[x86.Instr]:
+        regions = [[]]
+        for i in instrs:
+            if is_barrier(i):
+                regions[-1].append(i)
+                regions.append([])
+            else:
+                regions[-1].append(i)
+
+        new_instrs = []
+        for n, region in enumerate(regions):
+            body = [i for i in region if not is_barrier(i)]
+            barrier = [i for i in region if is_barrier(i)]
+            used_later = set()
+            for later in regions[n+1:]:
+                for i in later:
+                    if not is_barrier(i):
+                        used_later |= uses_defs(i)[0]
+            new_instrs += schedule_region(body, used_later) + barrier
+        return new_instrs
+
+    match program:
+        case x86.X86Program(blocks):
+            new_blocks = {label: schedule_block(instrs) for label, instrs in blocks.items()}
+            return x86.X86Program(new_blocks)
+
+
 ##################################################
 # allocate-registers
 ##################################################
@@ -895,11 +2896,55 @@ def allocate_registers(program: X86ProgramDefs) -> X86ProgramDefs:
 
     match program:
         case X86ProgramDefs(defs):
-            new_defs = []
-            for d in defs:
+            _clobbers.clear()
+            allocated = {}
+
+            # allocate callees before their callers, so each call site can use
+            # the callee's clobber summary
+            for d in _callees_first(defs):
                 new_program = _allocate_registers(d.label, x86.X86Program(d.blocks))
-                new_defs.append(X86FunctionDef(d.label, new_program.blocks, new_program.stack_space))
-            return X86ProgramDefs(new_defs)
+                allocated[d.label] = X86FunctionDef(d.label, new_program.blocks, new_program.stack_space)
+            return X86ProgramDefs([allocated[d.label] for d in defs])
+
+
+def _call_graph(defs: List[X86FunctionDef]) -> Dict[str, Set[str]]:
+    """
+    Builds the direct call graph of a pseudo-x86 program.
+    :param defs: The function definitions of the program.
+    :return: A map from each function to the functions it calls directly.
+    """
+    graph = {}
+    for d in defs:
+        graph[d.label] = set()
+        for instrs in d.blocks.values():
+            for i in instrs:
+                match i:
+                    case x86.Callq(label) | x86.TailJmp(x86.FunRef(label), _) if label in function_names:
+                        graph[d.label].add(label)
+    return graph
+
+
+def _callees_first(defs: List[X86FunctionDef]) -> List[X86FunctionDef]:
+    """
+    Orders function definitions so that every function comes after the
+    functions it calls (except along recursive cycles).
+    """
+    graph = _call_graph(defs)
+    by_label = {d.label: d for d in defs}
+    order = []
+    visited = set()
+
+    def visit(label: str):
+        if label in visited or label not in by_label:
+            return
+        visited.add(label)
+        for callee in sorted(graph[label]):
+            visit(callee)
+        order.append(by_label[label])
+
+    for d in defs:
+        visit(d.label)
+    return order
 
 
 def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X86Program:
@@ -912,14 +2957,15 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
     locations.
     """
 
-    blocks = program.blocks
+    blocks = dict(program.blocks)
     live_before_sets = {current_function + 'conclusion': set()}
     for label in blocks:
         live_before_sets[label] = set()
     live_after_sets = {}
     homes: Dict[x86.Var, x86.Arg] = {}
-    tuple_homes: Dict[x86.Var, x86.Arg] = {}
-    tuple_vars = set(tuple_var_types.keys())
+    tuple_homes: Dict[str, int] = {}
+    tuple_vars = set(tuple_var_types.keys()) - unrooted_pointers.get(current_function, set())
+    allocatable_registers = constants.caller_saved_registers + constants.callee_saved_registers
 
     # --------------------------------------------------
     # utilities
@@ -931,21 +2977,36 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
             case x86.GlobalVal(v):
                 return set()
             case x86.Reg(r):
-                return set()
+                # allocatable registers take part in liveness so that variables
+                # are kept out of argument registers while those are in use
+                return { x86.Reg(r) } if r in allocatable_registers else set()
             case x86.ByteReg(r):
                 return set()
             case x86.Var(x):
-                return { x86.Var(x) } if x not in tuple_var_types else set()
+                return { x86.Var(x) }
             case x86.Deref(x86.Var(x), _offset):
-                return { x86.Var(x) } if x not in tuple_var_types else set()
+                return { x86.Var(x) }
             case x86.Deref(_, _):
                 return set()
             case _:
                 return set()
 
+    def call_arity(label: str) -> int:
+        runtime_arities = {'print_int': 1, 'collect': 2}
+        if label in runtime_arities:
+            return runtime_arities[label]
+        return len(function_params.get(label, []))
+
+    def argument_regs(n: int) -> Set[x86.Reg]:
+        return {x86.Reg(r) for r in constants.argument_registers[:n]}
+
     def reads_of(i: x86.Instr) -> Set[x86.Var]:
         match i:
-            case x86.Movq(e1, _) | x86.Movzbq(e1, _) | x86.Pushq(e1) | x86.IndirectCallq(e1):
+            case x86.Callq(label):
+                return argument_regs(call_arity(label))
+            case x86.IndirectCallq(e1, num_args) | x86.TailJmp(e1, num_args):
+                return vars_arg(e1).union(argument_regs(num_args))
+            case x86.Movq(e1, _) | x86.Movzbq(e1, _) | x86.Pushq(e1):
                 return vars_arg(e1)
             case x86.Addq(e1, e2) | x86.Cmpq(e1, e2) | x86.Imulq(e1, e2) | \
                  x86.Subq(e1, e2) | x86.Andq(e1, e2) | x86.Orq(e1, e2) | x86.Xorq(e1, e2) | \
@@ -956,21 +3017,24 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
                 # are the live-before variables of the destination block
                 return live_before_sets[label]
             case _:
-                if isinstance(i, (x86.Callq, x86.Set, x86.Popq)):
+                if isinstance(i, (x86.Set, x86.Popq)):
                     return set()
                 else:
                     raise Exception(i)
 
     def writes_of(i: x86.Instr) -> Set[x86.Var]:
         match i:
+            case x86.Callq(label) if len(unboxed_returns.get(label, [])) > 1:
+                # the second field of an unboxed result comes back in rdx
+                return {x86.Reg('rdx')}
             case x86.Movq(_, e2) | x86.Movzbq(_, e2) | \
-                 x86.Addq(_, e2) | x86.Cmpq(_, e2) | x86.Imulq(_, e2) | \
+                 x86.Addq(_, e2) | x86.Imulq(_, e2) | \
                  x86.Subq(_, e2) | x86.Andq(_, e2) | x86.Orq(_, e2) | x86.Xorq(_, e2) | \
                  x86.Popq(e2) | x86.Leaq(_, e2):
                 return vars_arg(e2)
             case _:
                 if isinstance(i, (x86.Jmp, x86.JmpIf, x86.Callq, x86.Set, x86.IndirectCallq,
-                                  x86.Pushq)):
+                                  x86.Pushq, x86.TailJmp, x86.Cmpq)):
                     return set()
                 else:
                     raise Exception(i)
@@ -1012,12 +3076,73 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
     def bi_instr(e: x86.Instr, live_after: Set[x86.Var], graph: InterferenceGraph):
         for v1 in writes_of(e):
             for v2 in live_after:
+                # the source of a move holds the same value as its destination,
+                # so the two don't interfere (this is what lets moves coalesce)
+                if isinstance(e, x86.Movq) and v2 in vars_arg(e.a1):
+                    continue
                 graph.add_edge(v1, v2)
 
     def bi_block(instrs: List[x86.Instr], live_afters: List[Set[x86.Var]], graph: InterferenceGraph):
         for instr, live_after in zip(instrs, live_afters):
             bi_instr(instr, live_after, graph)
 
+    # --------------------------------------------------
+    # move coalescing
+    # --------------------------------------------------
+    def move_pairs() -> List[Tuple[x86.Var, x86.Var]]:
+        pairs = []
+        for instrs in blocks.values():
+            for i in instrs:
+                match i:
+                    case x86.Movq(x86.Var(_) as src, x86.Var(_) as dst) \
+                            if src != dst and vars_arg(src) and vars_arg(dst):
+                        pairs.append((src, dst))
+        return pairs
+
+    def coalesce(local_vars: Set[x86.Var], graph: InterferenceGraph) \
+            -> Tuple[Dict[x86.Var, x86.Var], InterferenceGraph]:
+        """
+        Conservatively merges move-related variables that don't interfere.
+        A pair is merged when the Briggs test passes (the merged node has fewer
+        than k neighbors of significant degree) or the George test passes (every
+        neighbor of one side already interferes with the other side or has
+        insignificant degree), so merging never makes the graph harder to color.
+        :return: A map from every variable to the variable it was merged into,
+        and the interference graph over those representatives.
+        """
+        k = len(constants.caller_saved_registers + constants.callee_saved_registers)
+        coalesced = graph.copy()
+        for v in local_vars:
+            coalesced.add_node(v)
+        alias = {v: v for v in local_vars}
+
+        def find(v: x86.Var) -> x86.Var:
+            while alias[v] != v:
+                alias[v] = alias[alias[v]]
+                v = alias[v]
+            return v
+
+        def significant(v: x86.Var) -> bool:
+            return coalesced.degree(v) >= k
+
+        def briggs(a: x86.Var, b: x86.Var) -> bool:
+            merged = coalesced.neighbors(a) | coalesced.neighbors(b)
+            return len([t for t in merged if significant(t)]) < k
+
+        def george(a: x86.Var, b: x86.Var) -> bool:
+            return all(coalesced.has_edge(a, t) or not significant(t)
+                       for t in coalesced.neighbors(b))
+
+        for src, dst in move_pairs():
+            a, b = find(src), find(dst)
+            if a == b or coalesced.has_edge(a, b):
+                continue
+            if briggs(a, b) or george(a, b):
+                coalesced.merge(a, b)
+                alias[b] = a
+
+        return {v: find(v) for v in local_vars}, coalesced
+
     # --------------------------------------------------
     # graph coloring
     # --------------------------------------------------
@@ -1045,10 +3170,194 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
 
             # Add x's color to the saturation sets of its neighbors
             for y in interference_graph.neighbors(x):
-                saturation_sets[y].add(x_color)
+                if y in saturation_sets:
+                    saturation_sets[y].add(x_color)
+
+        return coloring
+
+    # --------------------------------------------------
+    # linear scan
+    # --------------------------------------------------
+    def use_linear_scan() -> bool:
+        if register_allocator == 'auto':
+            return sum(len(instrs) for instrs in blocks.values()) > linear_scan_threshold
+        else:
+            return register_allocator == 'linear'
+
+    def live_intervals() -> Tuple[Dict[x86.Var, Tuple[int, int]], Dict[str, List[int]], Dict[str, List[int]]]:
+        """
+        Numbers the instructions in block order and computes, for every
+        variable, the first and last position where it is written, read or
+        live. Also records the positions where each register is written and
+        where it is live.
+        :return: The intervals, and the register write and live positions.
+        """
+        intervals = {}
+        reg_writes = {r: [] for r in allocatable_registers}
+        reg_lives = {r: [] for r in allocatable_registers}
+        position = 0
+        for label, instrs in blocks.items():
+            for i, live_after in zip(instrs, live_after_sets[label]):
+                writes = writes_of(i)
+                for v in reads_of(i) | writes | live_after:
+                    if isinstance(v, x86.Var):
+                        start, end = intervals.get(v, (position, position))
+                        intervals[v] = (min(start, position), max(end, position))
+                    elif v in writes:
+                        reg_writes[v.val].append(position)
+                    if isinstance(v, x86.Reg) and v in live_after:
+                        reg_lives[v.val].append(position)
+                position += 1
+        return intervals, reg_writes, reg_lives
+
+    def linear_scan(intervals: Dict[x86.Var, Tuple[int, int]]) -> Coloring:
+        """
+        Colors the variables in a single pass over their live intervals in
+        order of start position. The first k colors stand for registers; when
+        all of them are taken, the interval that ends last is spilled to a
+        color of its own, and stack colors are reused once their intervals end.
+        """
+        k = len(allocatable_registers)
+        coloring: Coloring = {}
+        free_registers = list(range(k))
+        free_stack = []
+        next_stack = k
+        active = []     # (end, var) pairs holding a register color
+        spilled = []    # (end, var) pairs holding a stack color
+
+        def expire(running: List[Tuple[int, x86.Var]], free: List[Color], start: int):
+            # an interval ending where the next one starts can hand over its
+            # color, since the instruction there reads before it writes
+            for entry in [e for e in running if e[0] <= start]:
+                running.remove(entry)
+                free.append(coloring[entry[1]])
+
+        def spill(v: x86.Var):
+            nonlocal next_stack
+            if free_stack:
+                coloring[v] = free_stack.pop()
+            else:
+                coloring[v] = next_stack
+                next_stack += 1
+            spilled.append((intervals[v][1], v))
+
+        for v in sorted(intervals, key=lambda v: (intervals[v], v.var)):
+            start, end = intervals[v]
+            expire(active, free_registers, start)
+            expire(spilled, free_stack, start)
+
+            if free_registers:
+                coloring[v] = free_registers.pop()
+                active.append((end, v))
+            else:
+                furthest = max(active, key=lambda e: e[0])
+                if furthest[0] > end:
+                    active.remove(furthest)
+                    coloring[v] = coloring[furthest[1]]
+                    active.append((end, v))
+                    spill(furthest[1])
+                else:
+                    spill(v)
 
         return coloring
 
+    def interval_forbidden_registers(intervals: Dict[x86.Var, Tuple[int, int]],
+                                     reg_writes: Dict[str, List[int]],
+                                     reg_lives: Dict[str, List[int]],
+                                     coloring: Coloring) -> Dict[Color, Set[str]]:
+        # a variable can't use a register that is written inside its interval
+        # or live anywhere in it
+        forbidden = {color: set() for color in coloring.values()}
+        for v, (start, end) in intervals.items():
+            for r in allocatable_registers:
+                writes, lives = reg_writes[r], reg_lives[r]
+                i = bisect.bisect_left(writes, start)
+                j = bisect.bisect_left(lives, start)
+                if (i < len(writes) and writes[i] < end) or (j < len(lives) and lives[j] <= end):
+                    forbidden[coloring[v]].add(r)
+        return forbidden
+
+    # --------------------------------------------------
+    # spill costs
+    # --------------------------------------------------
+    def successors(label: str) -> Set[str]:
+        return {i.label for i in blocks[label]
+                if isinstance(i, (x86.Jmp, x86.JmpIf)) and i.label in blocks}
+
+    def loop_depths() -> Dict[str, int]:
+        """
+        Computes how many loops each block is nested in, from the natural
+        loops of the back edges found by a depth-first walk of the CFG.
+        """
+        start = current_function + 'start'
+        back_edges = []
+        visited = set()
+        on_stack = set()
+
+        def dfs(label: str):
+            visited.add(label)
+            on_stack.add(label)
+            for succ in sorted(successors(label)):
+                if succ in on_stack:
+                    back_edges.append((label, succ))
+                elif succ not in visited:
+                    dfs(succ)
+            on_stack.remove(label)
+
+        if start in blocks:
+            dfs(start)
+
+        predecessors = {label: set() for label in blocks}
+        for label in blocks:
+            for succ in successors(label):
+                predecessors[succ].add(label)
+
+        loops: Dict[str, Set[str]] = {}
+        for tail, header in back_edges:
+            body = loops.setdefault(header, {header})
+            worklist = [tail]
+            while worklist:
+                label = worklist.pop()
+                if label not in body:
+                    body.add(label)
+                    worklist.extend(predecessors[label])
+
+        depths = {label: 0 for label in blocks}
+        for body in loops.values():
+            for label in body:
+                depths[label] += 1
+        return depths
+
+    def spill_costs() -> Dict[x86.Var, int]:
+        # every use or definition costs 10 per level of loop nesting
+        depths = loop_depths()
+        costs = {}
+        for label, instrs in blocks.items():
+            for i in instrs:
+                if isinstance(i, (x86.Jmp, x86.JmpIf)):
+                    continue
+                for v in reads_of(i) | writes_of(i):
+                    if isinstance(v, x86.Var):
+                        costs[v] = costs.get(v, 0) + 10 ** depths[label]
+        return costs
+
+    def constant_vars() -> Dict[x86.Var, int]:
+        """
+        Finds the variables that only ever hold one constant, which can be
+        rematerialized as immediates instead of being spilled.
+        """
+        values = {}
+        non_constant = set()
+        for instrs in blocks.values():
+            for i in instrs:
+                match i:
+                    case x86.Movq(x86.Immediate(c), x86.Var(_) as v) if -2**31 <= c < 2**31:
+                        if values.setdefault(v, c) != c:
+                            non_constant.add(v)
+                    case _:
+                        non_constant |= writes_of(i)
+        return {v: c for v, c in values.items() if v not in non_constant}
+
     # --------------------------------------------------
     # assigning homes
     # --------------------------------------------------
@@ -1058,24 +3367,48 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
         else:
             return num_bytes + (16 - (num_bytes % 16))
 
+    def is_pointer(v: x86.Var) -> bool:
+        return isinstance(v, x86.Var) and v.var in tuple_vars
+
+    def root_slot(v: x86.Var) -> x86.Arg:
+        return x86.Deref('r15', -8 * (tuple_homes[v.var] + 1))
+
+    def color_root_slots(spilled_pointers: Set[x86.Var], interferes) -> Dict[str, int]:
+        """
+        Assigns root-stack slots to the pointer variables that need one, so
+        that pointers whose slots are never in use at the same time share.
+        A spilled pointer occupies its slot for its whole lifetime, while a
+        pointer kept in a register only uses its slot across the calls that
+        may collect.
+        """
+        slot_graph = InterferenceGraph()
+        for v in spilled_pointers:
+            slot_graph.add_node(v)
+            for u in spilled_pointers:
+                if interferes(v, u):
+                    slot_graph.add_edge(v, u)
+
+        for label, instrs in blocks.items():
+            for i, live_after in zip(instrs, live_after_sets[label]):
+                if isinstance(i, (x86.Callq, x86.IndirectCallq)) and triggers_collection(i):
+                    in_slots = [v for v in live_after if is_pointer(v)]
+                    for v in in_slots:
+                        slot_graph.add_node(v)
+                        for u in in_slots:
+                            slot_graph.add_edge(v, u)
+
+        slots = color_graph(set(slot_graph.get_nodes()), slot_graph)
+        return {v.var: slot for v, slot in slots.items()}
+
     def ah_arg(a: x86.Arg) -> x86.Arg:
         match a:
-            case x86.Immediate(_) | x86.GlobalVal(_) | x86.Reg(_) | x86.ByteReg(_):
+            case x86.Immediate(_) | x86.GlobalVal(_) | x86.Reg(_) | x86.ByteReg(_) | x86.FunRef(_):
                 return a
             case x86.Var(x):
-                if x in tuple_vars:
-                    if x in tuple_homes:
-                        return tuple_homes[x]
-                    else:
-                        current_stack_size = len(tuple_homes) * 8
-                        offset = -(current_stack_size + 8)
-                        tuple_homes[x] = x86.Deref('r15', offset)
-                        return x86.Deref('r15', offset)
+                if a in homes:
+                    return homes[a]
                 else:
-                    if a in homes:
-                        return homes[a]
-                    else:
-                        return x86.Reg('r8')
+                    return x86.Reg('r8')
             case x86.Deref(r, offset):
                 return a
             case _:
@@ -1109,6 +3442,8 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
                 return x86.Popq(ah_arg(a1))
             case x86.IndirectCallq(a1, i):
                 return x86.IndirectCallq(ah_arg(a1), i)
+            case x86.TailJmp(a1, i):
+                return x86.TailJmp(ah_arg(a1), i)
             case x86.Leaq(a1, a2):
                 return x86.Leaq(ah_arg(a1), ah_arg(a2))
             case _:
@@ -1117,8 +3452,64 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
                 else:
                     raise Exception('ah_instr', e)
 
-    def ah_block(instrs: List[x86.Instr]) -> List[x86.Instr]:
-        return [ah_instr(i) for i in instrs]
+    def ah_block(label: str, instrs: List[x86.Instr]) -> List[x86.Instr]:
+        new_instrs = []
+        for i, live_after in zip(instrs, live_after_sets[label]):
+            if any(isinstance(homes.get(v), x86.Immediate) for v in writes_of(i)):
+                # the definition of a rematerialized constant
+                continue
+            elif isinstance(i, (x86.Callq, x86.IndirectCallq)):
+                new_instrs.extend(save_around_call(ah_instr(i), live_after))
+            else:
+                new_instrs.append(ah_instr(i))
+        return new_instrs
+
+    def clobbered_by(call: x86.Instr) -> Set[str]:
+        # a function that has already been allocated publishes the registers
+        # it may overwrite; anything else (runtime functions, indirect calls,
+        # recursive calls) may overwrite any caller-saved register
+        match call:
+            case x86.Callq(label) | x86.TailJmp(x86.FunRef(label), _) if label in _clobbers:
+                return _clobbers[label]
+            case _:
+                return set(constants.caller_saved_registers)
+
+    def triggers_collection(call: x86.Instr) -> bool:
+        # everything but printing may collect, or allocate and so collect
+        match call:
+            case x86.Callq('print_int'):
+                return False
+            case _:
+                return True
+
+    def save_around_call(call: x86.Instr, live_after: Set[x86.Var]) -> List[x86.Instr]:
+        # pointers held in registers are written to the root stack before a
+        # call that may collect, and read back afterwards since the collector
+        # may have moved what they point to
+        live_pointers = []
+        if triggers_collection(call):
+            live_pointers = sorted([v for v in live_after
+                                    if is_pointer(v) and isinstance(homes[v], x86.Reg)],
+                                   key=lambda v: v.var)
+
+        # only the caller-saved registers holding a value that is still
+        # needed after the call, and that the callee may overwrite, have to
+        # be preserved
+        live_regs = {homes[v] for v in live_after
+                     if isinstance(v, x86.Var) and v not in live_pointers}
+        saved = [x86.Reg(r) for r in constants.caller_saved_registers
+                 if x86.Reg(r) in live_regs and r in clobbered_by(call)]
+
+        # keep the stack 16-byte aligned at the call
+        padding = [x86.Immediate(8)] if len(saved) % 2 == 1 else []
+
+        return [x86.Pushq(r) for r in saved] + \
+               [x86.Subq(p, x86.Reg('rsp')) for p in padding] + \
+               [x86.Movq(homes[v], root_slot(v)) for v in live_pointers] + \
+               [call] + \
+               [x86.Movq(root_slot(v), homes[v]) for v in live_pointers] + \
+               [x86.Addq(p, x86.Reg('rsp')) for p in padding] + \
+               [x86.Popq(r) for r in reversed(saved)]
 
     # --------------------------------------------------
     # main body of the pass
@@ -1126,56 +3517,153 @@ def _allocate_registers(current_function: str, program: x86.X86Program) -> x86.X
 
     # Step 1: Perform liveness analysis
     ul_fixpoint()
+
+    # A pointer assigned on only some paths is live into the function, and
+    # would be saved to the root stack around calls before it is ever set;
+    # start it out as null so the collector never sees garbage
+    start = current_function + 'start'
+    unset_pointers = sorted([v for v in live_before_sets[start] if is_pointer(v)], key=lambda v: v.var)
+    if unset_pointers:
+        blocks[start] = [x86.Movq(x86.Immediate(0), v) for v in unset_pointers] + blocks[start]
+        ul_fixpoint()
     log_ast('live-after sets', live_after_sets)
 
-    # Step 2: Build the interference graph
-    interference_graph = InterferenceGraph()
+    if use_linear_scan():
+        # Steps 2-4 (fast mode): color the variables by scanning their live
+        # intervals, without building an interference graph
+        intervals, reg_writes, reg_lives = live_intervals()
+        all_vars = set(intervals.keys())
+        coloring = linear_scan(intervals)
+        forbidden_registers = interval_forbidden_registers(intervals, reg_writes, reg_lives, coloring)
+        colors_used = set(coloring.values())
+        log('linear scan coloring', coloring)
+
+        def interferes(u: x86.Var, v: x86.Var) -> bool:
+            return intervals[u][0] <= intervals[v][1] and intervals[v][0] <= intervals[u][1]
+    else:
+        # Step 2: Build the interference graph
+        interference_graph = InterferenceGraph()
+
+        for label in blocks.keys():
+            bi_block(blocks[label], live_after_sets[label], interference_graph)
+
+        log_ast('interference graph', interference_graph)
 
-    for label in blocks.keys():
-        bi_block(blocks[label], live_after_sets[label], interference_graph)
+        # Step 3: Coalesce move-related variables
+        all_vars = set(interference_graph.get_nodes())
+        for instrs in blocks.values():
+            for i in instrs:
+                all_vars |= reads_of(i) | writes_of(i)
+        all_vars = {v for v in all_vars if isinstance(v, x86.Var)}
 
-    log_ast('interference graph', interference_graph)
+        representatives, coalesced_graph = coalesce(all_vars, interference_graph)
+        log('coalesced variables', {v: r for v, r in representatives.items() if v != r})
 
-    # Step 3: Color the graph
-    all_vars = interference_graph.get_nodes()
-    coloring = color_graph(all_vars, interference_graph)
-    colors_used = set(coloring.values())
-    log('coloring', coloring)
+        # Step 4: Color the graph
+        representative_coloring = color_graph(set(representatives.values()), coalesced_graph)
+        coloring = {v: representative_coloring[representatives[v]] for v in all_vars}
+        colors_used = set(coloring.values())
+        log('coloring', coloring)
+
+        # A color can't live in a register that one of its variables interferes
+        # with (e.g. an argument register written while the variable is live)
+        forbidden_registers = {color: set() for color in colors_used}
+        for v in set(representatives.values()):
+            forbidden_registers[coloring[v]] |= {r.val for r in coalesced_graph.neighbors(v)
+                                                 if isinstance(r, x86.Reg)}
+
+        interferes = interference_graph.has_edge
 
     # Defines the set of registers to use
     available_registers = constants.caller_saved_registers + constants.callee_saved_registers
 
-    # Step 4: map variables to homes
+    # Colors holding a variable that is live across a call prefer registers
+    # those calls don't overwrite, so the call site doesn't have to save them
+    call_clobbers = {color: set() for color in colors_used}
+    for label, instrs in blocks.items():
+        for i, live_after in zip(instrs, live_after_sets[label]):
+            if isinstance(i, (x86.Callq, x86.IndirectCallq)):
+                for v in live_after:
+                    if isinstance(v, x86.Var):
+                        call_clobbers[coloring[v]] |= clobbered_by(i)
+
+    # Step 5: map variables to homes
     color_map = {}
     stack_locations_used = 0
+    spilled_colors = set()
+    rematerializable = constant_vars()
 
-    # Step 4.1: Map colors to locations (the "color map")
-    for color in sorted(colors_used):
-        if available_registers != []:
-            r = available_registers.pop()
+    # Colors are given registers in order of decreasing spill cost, so the
+    # cheapest colors (used rarely, outside of loops) are the ones spilled
+    costs = spill_costs()
+    color_costs = {color: 0 for color in colors_used}
+    for v in all_vars:
+        color_costs[coloring[v]] += costs.get(v, 0)
+    log('spill costs', costs)
+
+    # Step 5.1: Map colors to locations (the "color map")
+    for color in sorted(colors_used, key=lambda c: (-color_costs[c], c)):
+        caller_saved = [r for r in reversed(constants.caller_saved_registers)]
+        callee_saved = [r for r in reversed(constants.callee_saved_registers)]
+        preserved = [r for r in caller_saved if r not in call_clobbers[color]]
+        clobbered = [r for r in caller_saved if r in call_clobbers[color]]
+        preference = preserved + callee_saved + clobbered
+        candidates = [r for r in preference
+                      if r in available_registers and r not in forbidden_registers[color]]
+
+        if candidates != []:
+            r = candidates[0]
+            available_registers.remove(r)
             color_map[color] = x86.Reg(r)
         else:
+            spilled_colors.add(color)
+            if all(v in rematerializable or is_pointer(v)
+                   for v in all_vars if coloring[v] == color):
+                continue
             offset = stack_locations_used+1
             color_map[color] = x86.Deref('rbp', -(offset * 8))
             stack_locations_used += 1
 
-    # Step 4.2: Compose the "coloring" with the "color map" to get "homes"
+    # Step 5.2: Compose the "coloring" with the "color map" to get "homes";
+    # spilled constants are rematerialized as immediates at each use
+    spilled_pointers = set()
     for v in all_vars:
-        homes[v] = color_map[coloring[v]]
+        if coloring[v] in spilled_colors and v in rematerializable:
+            homes[v] = x86.Immediate(rematerializable[v])
+        elif coloring[v] in spilled_colors and is_pointer(v):
+            spilled_pointers.add(v)
+        else:
+            homes[v] = color_map[coloring[v]]
+
+    # Step 5.3: Share root-stack slots between pointers; spilled pointers
+    # live in their slot, where the collector can see them
+    tuple_homes.update(color_root_slots(spilled_pointers, interferes))
+    for v in spilled_pointers:
+        homes[v] = root_slot(v)
+    log('root stack slots', tuple_homes)
     log('homes', homes)
     
-    # Step 5: replace variables with their homes
-    blocks = program.blocks
-    new_blocks = {label: ah_block(block) for label, block in blocks.items()}
+    # Step 6: replace variables with their homes
+    new_blocks = {label: ah_block(label, block) for label, block in blocks.items()}
 
     regular_stack_space = align(8 * stack_locations_used)
-    root_stack_slots = len(tuple_homes)
+    root_stack_slots = len(set(tuple_homes.values()))
     
-    arg_regs = constants.argument_registers
-    for idx, param_name in enumerate(function_params.get(current_function, [])):
-        homes[param_name] = x86.Reg(arg_regs[idx])
     _homes[current_function] = homes
 
+    # Step 7: summarize the caller-saved registers this function and its
+    # callees may overwrite (popping a saved register restores it)
+    clobbered = set()
+    for instrs in new_blocks.values():
+        for i in instrs:
+            if isinstance(i, (x86.Callq, x86.IndirectCallq, x86.TailJmp)):
+                # a tail-called function returns straight to our caller
+                clobbered |= clobbered_by(i)
+            elif not isinstance(i, x86.Popq):
+                clobbered |= {r.val for r in writes_of(i) if r.val in constants.caller_saved_registers}
+    _clobbers[current_function] = clobbered
+    log('clobbered registers', clobbered)
+
     return x86.X86Program(new_blocks, stack_space = (regular_stack_space, root_stack_slots))
 
 
@@ -1231,18 +3719,44 @@ def _patch_instructions(program: x86.X86Program, homes: Dict[x86.Var, x86.Arg])
     def pi_instr(instr: x86.Instr) -> List[x86.Instr]:
         instr = instr.__class__(*(patch_arg(arg) for arg in instr.args)) if hasattr(instr, 'args') else instr
         match instr:
+            case x86.Movq(a1, a2) if a1 == a2:
+                return []
             case x86.Cmpq(a1, x86.Immediate(i)):
                 return [x86.Movq(x86.Immediate(i), x86.Reg('rax')),
                         x86.Cmpq(a1, x86.Reg('rax'))]
             case x86.Movq(x86.Deref(r1, o1), x86.Deref(r2, o2)):
                 return [x86.Movq(x86.Deref(r1, o1), x86.Reg('rax')),
                         x86.Movq(x86.Reg('rax'), x86.Deref(r2, o2))]
+            case x86.Cmpq(x86.GlobalVal(_) | x86.Deref(_, _), x86.Deref(_, _)):
+                return [x86.Movq(instr.a1, x86.Reg('rax')),
+                        x86.Cmpq(x86.Reg('rax'), instr.a2)]
+            case x86.Movq(x86.GlobalVal(_), x86.Deref(_, _)) | \
+                 x86.Addq(x86.GlobalVal(_), x86.Deref(_, _)):
+                return [x86.Movq(instr.a1, x86.Reg('rax')),
+                        instr.__class__(x86.Reg('rax'), instr.a2)]
+            case x86.Leaq(a1, x86.Deref(r2, o2)):
+                # leaq can only write to a register
+                return [x86.Leaq(a1, x86.Reg('rax')),
+                        x86.Movq(x86.Reg('rax'), x86.Deref(r2, o2))]
+            case x86.Movzbq(x86.ByteReg(r1), x86.Deref(r2, o2)):
+                # movzbq can only write to a register
+                return [x86.Movzbq(x86.ByteReg(r1), x86.Reg('rax')),
+                        x86.Movq(x86.Reg('rax'), x86.Deref(r2, o2))]
             case x86.Movzbq(x86.Deref(r1, o1), x86.Deref(r2, o2)):
                 return [x86.Movzbq(x86.Deref(r1, o1), x86.Reg('rax')),
                         x86.Movq(x86.Reg('rax'), x86.Deref(r2, o2))]
-            case x86.Addq(x86.Deref(r1, o1), x86.Deref(r2, o2)):
+            case x86.Imulq(a1, x86.Deref(r2, o2)):
+                # imulq can only write to a register
+                return [x86.Movq(x86.Deref(r2, o2), x86.Reg('rax')),
+                        x86.Imulq(a1, x86.Reg('rax')),
+                        x86.Movq(x86.Reg('rax'), x86.Deref(r2, o2))]
+            case x86.Addq(x86.Deref(r1, o1), x86.Deref(r2, o2)) | \
+                 x86.Subq(x86.Deref(r1, o1), x86.Deref(r2, o2)) | \
+                 x86.Andq(x86.Deref(r1, o1), x86.Deref(r2, o2)) | \
+                 x86.Orq(x86.Deref(r1, o1), x86.Deref(r2, o2)) | \
+                 x86.Xorq(x86.Deref(r1, o1), x86.Deref(r2, o2)):
                 return [x86.Movq(x86.Deref(r1, o1), x86.Reg('rax')),
-                        x86.Addq(x86.Reg('rax'), x86.Deref(r2, o2))]
+                        instr.__class__(x86.Reg('rax'), x86.Deref(r2, o2))]
             case _:
                 return [instr]
 
@@ -1259,6 +3773,150 @@ def _patch_instructions(program: x86.X86Program, homes: Dict[x86.Var, x86.Arg])
             return x86.X86Program(new_blocks, stack_space = stack_space)
 
 
+##################################################
+# peephole
+##################################################
+
+def peephole(program: X86ProgramDefs) -> X86ProgramDefs:
+    """
+    Rewrites short windows of instructions into cheaper equivalents, using a
+    table of rules. How often each rule fired is kept in `peephole_stats`.
+    :param program: An x86 program, after patching.
+    :return: An equivalent x86 program.
+    """
+    peephole_stats.clear()
+
+    match program:
+        case X86ProgramDefs(defs):
+            new_defs = []
+            for d in defs:
+                new_prog = _peephole(x86.X86Program(d.blocks, d.stack_space))
+                new_defs.append(X86FunctionDef(d.label, new_prog.blocks, d.stack_space))
+            log('peephole rules fired', peephole_stats)
+            return X86ProgramDefs(new_defs)
+
+
+def _peephole(program: x86.X86Program) -> x86.X86Program:
+    """
+    Applies the peephole rules to every block of one function.
+    :param program: An x86 program, after patching.
+    :return: An equivalent x86 program.
+    """
+    rax = x86.Reg('rax')
+    swapped_cc = {'e': 'e', 'l': 'g', 'le': 'ge', 'g': 'l', 'ge': 'le'}
+
+    # --------------------------------------------------
+    # utilities
+    # --------------------------------------------------
+    def mentions_rax(a: x86.Arg) -> bool:
+        match a:
+            case x86.Reg('rax') | x86.ByteReg('al') | x86.Deref('rax', _):
+                return True
+            case _:
+                return False
+
+    def rax_dead(rest: List[x86.Instr]) -> bool:
+        # rax is dead if it is overwritten before it is read; it only carries
+        # a value between blocks as the return value, into the conclusion
+        for i in rest:
+            match i:
+                case x86.Movq(a1, a2) | x86.Movzbq(a1, a2) | x86.Leaq(a1, a2):
+                    if mentions_rax(a1) or isinstance(a2, x86.Deref) and mentions_rax(a2):
+                        return False
+                    elif a2 == rax:
+                        return True
+                case x86.Set(_, x86.ByteReg('al')) | x86.Callq(_):
+                    return True
+                case x86.Jmp(label) | x86.JmpIf(_, label):
+                    if label.endswith('conclusion'):
+                        return False
+                    elif isinstance(i, x86.Jmp):
+                        return True
+                case x86.Retq() | x86.IndirectCallq(_, _):
+                    return False
+                case _:
+                    if any(mentions_rax(a) for a in i.__dict__.values()):
+                        return False
+        return False
+
+    def is_memory(a: x86.Arg) -> bool:
+        return isinstance(a, (x86.Deref, x86.GlobalVal))
+
+    # --------------------------------------------------
+    # rules: each takes a window of instructions and the instructions
+    # after it, and returns a replacement (or None if it doesn't apply)
+    # --------------------------------------------------
+    def self_move(window, rest):
+        match window:
+            case [x86.Movq(a1, a2)] if a1 == a2:
+                return []
+
+    def store_back(window, rest):
+        # movq a, b; movq b, a  =>  movq a, b
+        match window:
+            case [x86.Movq(a1, a2), x86.Movq(b1, b2)] if a1 == b2 and a2 == b1:
+                return [window[0]]
+
+    def move_through_rax(window, rest):
+        # movq a, %rax; movq %rax, b  =>  movq a, b  (when rax is dead after)
+        match window:
+            case [x86.Movq(a1, x86.Reg('rax')), x86.Movq(x86.Reg('rax'), a2)] \
+                    if not (is_memory(a1) and is_memory(a2)) and not mentions_rax(a2) \
+                    and rax_dead(rest):
+                return [x86.Movq(a1, a2)]
+
+    def compare_immediate(window, rest):
+        # movq $i, %rax; cmpq a, %rax; j<cc>  =>  cmpq $i, a; j<swapped cc>
+        match window:
+            case [x86.Movq(x86.Immediate(i), x86.Reg('rax')), x86.Cmpq(a1, x86.Reg('rax')),
+                  x86.JmpIf(cc, label)] if not isinstance(a1, x86.Immediate) and rax_dead(rest):
+                return [x86.Cmpq(x86.Immediate(i), a1), x86.JmpIf(swapped_cc[cc], label)]
+            case [x86.Movq(x86.Immediate(i), x86.Reg('rax')), x86.Cmpq(a1, x86.Reg('rax')),
+                  x86.Set(cc, a2)] if not isinstance(a1, x86.Immediate):
+                # only the low byte written by the set is read afterwards
+                return [x86.Cmpq(x86.Immediate(i), a1), x86.Set(swapped_cc[cc], a2)]
+
+    def add_to_lea(window, rest):
+        # movq %a, %x; addq $i, %x  =>  leaq i(%a), %x
+        match window:
+            case [x86.Movq(x86.Reg(a), x86.Reg(x)), x86.Addq(x86.Immediate(i), x86.Reg(y))] \
+                    if x == y and a != x:
+                return [x86.Leaq(x86.Deref(a, i), x86.Reg(x))]
+
+    rules = [
+        ('self move', 1, self_move),
+        ('store back', 2, store_back),
+        ('move through rax', 2, move_through_rax),
+        ('compare immediate', 3, compare_immediate),
+        ('add to lea', 2, add_to_lea),
+    ]
+
+    # --------------------------------------------------
+    # rewriting
+    # --------------------------------------------------
+    def peephole_block(instrs: List[x86.Instr]) -> List[x86.Instr]:
+        instrs = list(instrs)
+        n = 0
+        while n < len(instrs):
+            for name, size, rule in rules:
+                window = instrs[n:n+size]
+                replacement = rule(window, instrs[n+size:]) if len(window) == size else None
+                if replacement is not None:
+                    instrs[n:n+size] = replacement
+                    peephole_stats[name] = peephole_stats.get(name, 0) + 1
+                    # the rewrite may complete a window that starts earlier
+                    n = max(n - 2, 0)
+                    break
+            else:
+                n += 1
+        return instrs
+
+    match program:
+        case x86.X86Program(blocks, stack_space):
+            new_blocks = {label: peephole_block(instrs) for label, instrs in blocks.items()}
+            return x86.X86Program(new_blocks, stack_space = stack_space)
+
+
 ##################################################
 # prelude-and-conclusion
 ###################################################
@@ -1295,20 +3953,48 @@ def prelude_and_conclusion(program: X86ProgramDefs) -> x86.X86Program:
 
 def _prelude_and_conclusion(current_function: str, program: x86.X86Program) -> x86.X86Program:
     """
-    Adds the prelude and conclusion for the program.
+    Adds the prelude and conclusion for the program. Only the callee-saved
+    registers the function actually writes are saved, the frame pointer is
+    only set up when the function has stack slots, and leaf functions skip
+    the stack alignment padding entirely.
     :param program: An x86 program.
     :return: An x86 program, with prelude and conclusion.
     """
     stack_bytes, root_stack_locations = program.stack_space
 
-    # Prelude
-    prelude = [x86.Pushq(x86.Reg('rbp')),
-               x86.Movq(x86.Reg('rsp'), x86.Reg('rbp'))]
+    def written_register(i: x86.Instr) -> Optional[str]:
+        match i:
+            case x86.Movq(_, x86.Reg(r)) | x86.Movzbq(_, x86.Reg(r)) | x86.Leaq(_, x86.Reg(r)) | \
+                 x86.Addq(_, x86.Reg(r)) | x86.Subq(_, x86.Reg(r)) | x86.Imulq(_, x86.Reg(r)) | \
+                 x86.Andq(_, x86.Reg(r)) | x86.Orq(_, x86.Reg(r)) | x86.Xorq(_, x86.Reg(r)) | \
+                 x86.Popq(x86.Reg(r)):
+                return r
+            case _:
+                return None
+
+    instrs = [i for block in program.blocks.values() for i in block]
+    written = {written_register(i) for i in instrs}
+    saved_registers = [r for r in constants.callee_saved_registers if r in written]
+    is_leaf = current_function != 'main' and \
+        not any(isinstance(i, (x86.Callq, x86.IndirectCallq)) for i in instrs)
+    has_frame = stack_bytes > 0
+
+    # rsp is 16-byte aligned before the call into this function, so after the
+    # return address and an even number of pushes it needs another 8 bytes
+    pushes = len(saved_registers) + (1 if has_frame else 0)
+    padding = 8 if pushes % 2 == 0 and not is_leaf else 0
+    frame_bytes = stack_bytes + padding
 
-    for r in constants.callee_saved_registers:
-        prelude += [x86.Pushq(x86.Reg(r))]
+    # Prelude: callee-saved registers go above the frame pointer, so the
+    # rbp-relative spill slots can't overlap them
+    prelude = [x86.Pushq(x86.Reg(r)) for r in saved_registers]
 
-    prelude += [x86.Subq(x86.Immediate(stack_bytes), x86.Reg('rsp'))]
+    if has_frame:
+        prelude += [x86.Pushq(x86.Reg('rbp')),
+                    x86.Movq(x86.Reg('rsp'), x86.Reg('rbp'))]
+
+    if frame_bytes > 0:
+        prelude += [x86.Subq(x86.Immediate(frame_bytes), x86.Reg('rsp'))]
 
     if current_function == 'main':
         prelude += [x86.Movq(x86.Immediate(constants.root_stack_size), x86.Reg('rdi')),
@@ -1316,54 +4002,111 @@ def _prelude_and_conclusion(current_function: str, program: x86.X86Program) -> x
                     x86.Callq('initialize'),
                     x86.Movq(x86.GlobalVal('rootstack_begin'), x86.Reg('r15'))]
 
-    for _ in range(root_stack_locations):
-        prelude += [x86.Movq(x86.Immediate(0), x86.Deref('r15', 0)),
-                    x86.Addq(x86.Immediate(8), x86.Reg('r15'))]
+    # zero the root-stack slots (the collector scans them), then claim them
+    for slot in range(root_stack_locations):
+        prelude += [x86.Movq(x86.Immediate(0), x86.Deref('r15', 8*slot))]
+    if root_stack_locations > 0:
+        prelude += [x86.Addq(x86.Immediate(8*root_stack_locations), x86.Reg('r15'))]
     prelude += [x86.Jmp(current_function + 'start')]
 
     # Conclusion
-    conclusion = [x86.Addq(x86.Immediate(stack_bytes), x86.Reg('rsp')),
-                  x86.Subq(x86.Immediate(8*root_stack_locations), x86.Reg('r15'))]
+    conclusion = []
+    if frame_bytes > 0:
+        conclusion += [x86.Addq(x86.Immediate(frame_bytes), x86.Reg('rsp'))]
+
+    if root_stack_locations > 0:
+        conclusion += [x86.Subq(x86.Immediate(8*root_stack_locations), x86.Reg('r15'))]
 
-    for r in reversed(constants.callee_saved_registers):
+    if has_frame:
+        conclusion += [x86.Popq(x86.Reg('rbp'))]
+
+    for r in reversed(saved_registers):
         conclusion += [x86.Popq(x86.Reg(r))]
 
-    conclusion += [x86.Popq(x86.Reg('rbp')),
-                   x86.Retq()]
+    # a tail call tears down this function's frame, then jumps to the callee,
+    # which returns straight to our caller
+    def lower_tail_jumps(instrs: List[x86.Instr]) -> List[x86.Instr]:
+        match instrs[-1:]:
+            case [x86.TailJmp(x86.FunRef(label), _)]:
+                return instrs[:-1] + conclusion + [x86.Jmp(label)]
+            case _:
+                return instrs
+
+    new_blocks = {label: lower_tail_jumps(instrs) for label, instrs in program.blocks.items()}
+    conclusion += [x86.Retq()]
 
-    new_blocks = program.blocks.copy()
     new_blocks[current_function] = prelude
     new_blocks[current_function + 'conclusion'] = conclusion
     return x86.X86Program(new_blocks, stack_space = program.stack_space)
 
 
 ##################################################
-# add-allocate
+# layout-blocks
+##################################################
+
+def layout_blocks(program: x86.X86Program) -> x86.X86Program:
+    """
+    Orders the blocks so that each block is followed by the target of its
+    unconditional jump where possible, then removes jumps to the block that
+    comes next (when `drop_fallthrough_jumps` is set). A conditional jump to
+    the next block is inverted so the other edge falls through instead.
+    :param program: An x86 program.
+    :return: An equivalent x86 program.
+    """
+    negated_cc = {'e': 'ne', 'ne': 'e', 'l': 'ge', 'ge': 'l', 'g': 'le', 'le': 'g'}
+    blocks = program.blocks
+
+    def jump_target(instrs: List[x86.Instr]) -> Optional[str]:
+        match instrs[-1:]:
+            case [x86.Jmp(label)]:
+                return label
+            case _:
+                return None
+
+    # build chains: follow each unplaced block's unconditional jump, starting
+    # from the entry of each function
+    order = []
+    placed = set()
+    entries = [label for label in blocks if label + 'start' in blocks]
+    for label in entries + list(blocks):
+        while label is not None and label in blocks and label not in placed:
+            order.append(label)
+            placed.add(label)
+            label = jump_target(blocks[label])
+
+    new_blocks = {}
+    for n, label in enumerate(order):
+        instrs = blocks[label]
+        next_label = order[n + 1] if n + 1 < len(order) else None
+        if drop_fallthrough_jumps:
+            match instrs[-2:]:
+                case [x86.JmpIf(cc, then_label), x86.Jmp(else_label)] if then_label == next_label:
+                    instrs = instrs[:-2] + [x86.JmpIf(negated_cc[cc], else_label)]
+                case [*_, x86.Jmp(target)] if target == next_label:
+                    instrs = instrs[:-1]
+        new_blocks[label] = instrs
+
+    return x86.X86Program(new_blocks)
+
+
+##################################################
+# print-x86
 ##################################################
 
-def add_allocate(program: str) -> str:
-    """
-    Adds the 'allocate' function to the end of the program.
-    :param program: An x86 program, as a string.
-    :return: An x86 program, as a string, with the 'allocate' function.
-    """
-
-    alloc = """
-allocate:
-  movq free_ptr(%rip), %rax
-  addq %rdi, %rax
-  movq %rdi, %rsi
-  cmpq fromspace_end(%rip), %rax
-  jl allocate_alloc
-  movq %r15, %rdi
-  callq collect
-  jmp allocate_alloc
-allocate_alloc:
-  movq free_ptr(%rip), %rax
-  addq %rsi, free_ptr(%rip)
-  retq
-"""
-    return program + alloc
+def print_x86(program: x86.X86Program) -> str:
+    """
+    Prints the program, followed by a data section holding the preallocated
+    tuples: a tag followed by the fields, like a tuple on the heap.
+    :param program: An x86 program.
+    :return: A string, ready for gcc.
+    """
+    data = ''
+    if static_tuples:
+        data = '  .data\n  .p2align 3\n'
+        for (tag, *values), label in static_tuples.items():
+            data += f'{label}:\n' + ''.join([f'  .quad {w}\n' for w in [tag] + values])
+    return x86.print_x86(program) + data
+
 
 ##################################################
 # Compiler definition
@@ -1373,14 +4116,26 @@ compiler_passes = {
     'typecheck': typecheck,
     'remove complex opera*': rco,
     'eliminate objects': eliminate_objects,
+    'inline functions': inline_functions,
+    'fold constants': fold_constants,
+    'unbox calls': unbox_calls,
+    'scalar replace': scalar_replace,
+    'remove complex opera* 2': rco,
+    'reduce induction variables': reduce_induction_variables,
     'typecheck2': typecheck,
     'explicate control': explicate_control,
+    'number values': number_values,
+    'preallocate constants': preallocate_constants,
+    'eliminate dead code': eliminate_dead_code,
+    'simplify cfg': simplify_cfg,
     'select instructions': select_instructions,
+    'schedule instructions': schedule_instructions,
     'allocate registers': allocate_registers,
     'patch instructions': patch_instructions,
+    'peephole': peephole,
     'prelude & conclusion': prelude_and_conclusion,
-    'print x86': x86.print_x86,
-    'add allocate': add_allocate
+    'layout blocks': layout_blocks,
+    'print x86': print_x86
 }
 
 
@@ -1389,6 +4144,9 @@ def run_compiler(s, logging=False):
     tuple_var_types = {}
     dataclass_var_types = {}
     function_names = set()
+    unboxed_returns.clear()
+    mutable_dataclasses.clear()
+    static_tuples.clear()
 
     def print_prog(current_program):
         print('Concrete syntax:')
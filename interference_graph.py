@@ -1,5 +1,4 @@
-from typing import List, Set, Dict, Tuple, DefaultDict
-from collections import defaultdict
+from typing import List, Set, Dict, Tuple, Iterator, Hashable
 from cs3020_support.python import print_ast
 
 class InterferenceGraph:
@@ -7,35 +6,116 @@ class InterferenceGraph:
     A class to represent an interference graph: an undirected graph where nodes
     are str objects and an edge between two nodes indicates that the two
     nodes cannot share the same locations.
+
+    Nodes are numbered as they are added. Each node's neighbors are stored as a
+    single integer used as a bitset (bit j is set when the node interferes with
+    node j), alongside a running degree count, so even very dense graphs cost
+    one Python object per node rather than one per edge.
     """
-    graph: DefaultDict[str, Set[str]]
+    index: Dict[Hashable, int]
+    nodes: List[Hashable]
+    adjacency: List[int]
+    degrees: List[int]
 
     def __init__(self):
-        self.graph = defaultdict(lambda: set())
+        self.index = {}
+        self.nodes = []
+        self.adjacency = []
+        self.degrees = []
+
+    def add_node(self, a: Hashable) -> int:
+        if a not in self.index:
+            self.index[a] = len(self.nodes)
+            self.nodes.append(a)
+            self.adjacency.append(0)
+            self.degrees.append(0)
+        return self.index[a]
 
-    def add_edge(self, a: str, b: str):
+    def add_edge(self, a: Hashable, b: Hashable):
         if a != b:
-            self.graph[a].add(b)
-            self.graph[b].add(a)
+            i = self.add_node(a)
+            j = self.add_node(b)
+            if not (self.adjacency[i] >> j) & 1:
+                self.adjacency[i] |= 1 << j
+                self.adjacency[j] |= 1 << i
+                self.degrees[i] += 1
+                self.degrees[j] += 1
+
+    def has_edge(self, a: Hashable, b: Hashable) -> bool:
+        if a in self.index and b in self.index:
+            return bool((self.adjacency[self.index[a]] >> self.index[b]) & 1)
+        else:
+            return False
 
-    def neighbors(self, a: str) -> Set[str]:
-        if a in self.graph:
-            return self.graph[a]
+    def degree(self, a: Hashable) -> int:
+        if a in self.index:
+            return self.degrees[self.index[a]]
+        else:
+            return 0
+
+    def _members(self, bits: int) -> Iterator[int]:
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def neighbors(self, a: Hashable) -> Set[Hashable]:
+        if a in self.index:
+            return {self.nodes[j] for j in self._members(self.adjacency[self.index[a]])}
         else:
             return set()
 
     def get_nodes(self):
-        return set(self.graph.keys())
+        return self.index.keys()
 
-    def __str__(self):
-        pairs = set()
-        for k in self.graph.keys():
-            new_pairs = set((k, v) for v in self.graph[k])
-            pairs = pairs.union(new_pairs)
+    def merge(self, a: Hashable, b: Hashable):
+        """
+        Merges node b into node a: a inherits all of b's edges and b is removed.
+        The two nodes must not interfere.
+        """
+        i = self.add_node(a)
+        j = self.add_node(b)
+        assert not (self.adjacency[i] >> j) & 1
+        for t in self._members(self.adjacency[j]):
+            self.adjacency[t] &= ~(1 << j)
+            self.degrees[t] -= 1
+            if not (self.adjacency[t] >> i) & 1:
+                self.adjacency[t] |= 1 << i
+                self.adjacency[i] |= 1 << t
+                self.degrees[t] += 1
+                self.degrees[i] += 1
+        self.adjacency[j] = 0
+        self.degrees[j] = 0
+        del self.index[b]
+
+    def copy(self) -> 'InterferenceGraph':
+        g = InterferenceGraph()
+        g.index = self.index.copy()
+        g.nodes = self.nodes.copy()
+        g.adjacency = self.adjacency.copy()
+        g.degrees = self.degrees.copy()
+        return g
 
-        for a, b in list(pairs):
-            if (b, a) in pairs:
-                pairs.remove((a, b))
+    def edges(self) -> Iterator[Tuple[Hashable, Hashable]]:
+        """
+        Yields every edge exactly once, in time linear in the number of edges.
+        """
+        for a, i in self.index.items():
+            for j in self._members(self.adjacency[i] >> (i + 1)):
+                yield a, self.nodes[i + 1 + j]
 
-        strings = [print_ast(a) + ' -- ' + print_ast(b) for a, b in pairs]
+    def to_dot(self, name: str = 'interference') -> str:
+        """
+        Exports the graph in Graphviz DOT format.
+        """
+        lines = [f'graph {name} {{']
+        for a in self.index:
+            lines.append(f'  "{print_ast(a)}";')
+        for a, b in self.edges():
+            lines.append(f'  "{print_ast(a)}" -- "{print_ast(b)}";')
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def __str__(self):
+        strings = [print_ast(a) + ' -- ' + print_ast(b) for a, b in self.edges()]
         return 'InterferenceGraph{\n ' + ',\n '.join(strings) + '\n}'
@@ -5,10 +5,36 @@ import os
 import traceback
 import sys
 import subprocess
+import compiler
 from compiler import run_compiler
 from interpreter import eval_Lif
 from cs3020_support import eval_x86
 
+
+def explicit_fallthrough(x86_program: str) -> str:
+    """
+    The emulator runs each block on its own, so a block that falls through
+    into the next one would stop at its end. Adds a jump to the next block
+    wherever the compiled program falls through, leaving the block layout
+    the compiler chose unchanged.
+    :param x86_program: A compiled program, as printed for gcc
+    :return: The same program, with every fall-through made a jmp
+    """
+    lines = []
+    falls_through = False
+    for line in x86_program.splitlines():
+        instr = line.split()
+        if line.endswith(':') and not line.startswith(' '):
+            if falls_through:
+                lines.append(f'  jmp {line[:-1]}')
+            falls_through = False
+        elif instr and instr[0] in ['.data', '.text', '.globl', '.p2align', '.quad']:
+            falls_through = False
+        elif instr:
+            falls_through = instr[0] not in ['jmp', 'retq']
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
 # Pass the --run-gcc option to this file to run your compiled files in hardware
 # You must compile the runtime first and place it in the parent directory
 
@@ -29,9 +55,22 @@ for file_name in sorted(os.listdir('tests')):
             
                 x86_program = run_compiler(program, logging=False)
                 emu = eval_x86.X86Emulator(logging=False)
-                x86_output = emu.eval_program(x86_program)
+                x86_output = emu.eval_program(explicit_fallthrough(x86_program))
                 print("Compiled x86 result:", x86_output)
 
+                # compile it again with linear scan for every function, since
+                # the default only uses it for very large ones
+                compiler.register_allocator = 'linear'
+                try:
+                    linear_program = run_compiler(program, logging=False)
+                finally:
+                    compiler.register_allocator = 'auto'
+                emu = eval_x86.X86Emulator(logging=False)
+                linear_output = emu.eval_program(explicit_fallthrough(linear_program))
+                if linear_output != x86_output:
+                    print('Linear scan result differs! **************************************************')
+                    print('Linear scan x86 result:', linear_output)
+
                 # if x86_output == interpreter_result:
                 #     print('Test passed')
                 # else:
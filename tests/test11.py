@@ -0,0 +1,15 @@
+# Test 11: updating fields in place, through the object and through an alias
+class Point:
+    x: int
+    y: int
+
+def move(p: Point, dx: int) -> int:
+    p.x = p.x + dx
+    return p.x
+
+a = Point(1, 2)
+b = a
+b.y = 10
+print(a.y) # expect 10
+print(move(a, 5)) # expect 6
+print(a.x + b.x) # expect 6+6 = 12
@@ -0,0 +1,12 @@
+# Test 12: multiplying fields by constants, including 0, 1 and powers of two
+class Point:
+    x: int
+    y: int
+
+def scale(p: Point) -> int:
+    return p.x * 0 + p.y * 1 + 2 * p.x + p.y * 4 + p.x * 8 + p.y * 3
+
+p = Point(5, 7)
+print(scale(p)) # expect 0 + 7 + 10 + 28 + 40 + 21 = 106
+q = Point(-3, 2)
+print(scale(q)) # expect 0 + 2 - 6 + 8 - 24 + 6 = -14
@@ -0,0 +1,24 @@
+# Test 13: products of loop counters by constants in nested while loops
+class Range:
+    start: int
+    stop: int
+
+def weighted(r: Range) -> int:
+    total = 0
+    i = r.start
+    stop = r.stop
+    while i < stop:
+        j = 0
+        while j < 3:
+            total = total + i * 10 + j * 4 + i * 2
+            j = j + 1
+        i = i + 2
+    return total
+
+k = 10
+s = 0
+while k > 0:
+    s = s + k * 5
+    k = k - 3
+print(s) # expect 50 + 35 + 20 + 5 = 110
+print(weighted(Range(1, 6))) # expect i = 1, 3, 5: 3 * 12 * 9 + 3 * 3 * 4 = 360
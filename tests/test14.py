@@ -0,0 +1,17 @@
+# Test 14: two calls to the same function, with both results read after the second call
+class P:
+    x: int
+    y: int
+
+def mk(n: int) -> P:
+    if n == 0:
+        return P(0, 0)
+    else:
+        q = mk(n - 1)
+        return P(q.x + 1, q.y + 2)
+
+p1 = mk(1)
+p2 = mk(2)
+print(p1.x) # expect 1
+print(p2.y) # expect 4
+print(p1.y + p2.x) # expect 2 + 2 = 4
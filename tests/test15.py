@@ -0,0 +1,21 @@
+# Test 15: chains of copies between fields, locals and arguments
+class Pair:
+    a: int
+    b: int
+
+def swap_sum(p: Pair, n: int) -> int:
+    x = p.a
+    y = p.b
+    i = 0
+    while i < n:
+        t = x
+        x = y
+        y = t
+        i = i + 1
+    u = x
+    v = u
+    return v * 10 + y
+
+p = Pair(3, 8)
+print(swap_sum(p, 4)) # expect 3 * 10 + 8 = 38
+print(swap_sum(p, 5)) # expect 8 * 10 + 3 = 83
@@ -0,0 +1,29 @@
+# Test 16: more simultaneously live values than there are registers
+class Vec:
+    a: int
+    b: int
+    c: int
+    d: int
+
+def mix(v: Vec, w: Vec) -> int:
+    x1 = v.a + 1
+    x2 = v.b + 2
+    x3 = v.c + 3
+    x4 = v.d + 4
+    x5 = w.a + 5
+    x6 = w.b + 6
+    x7 = w.c + 7
+    x8 = w.d + 8
+    x9 = x1 + x2
+    x10 = x3 + x4
+    x11 = x5 + x6
+    x12 = x7 + x8
+    x13 = x1 * x8
+    x14 = x2 * x7
+    x15 = x3 * x6
+    x16 = x4 * x5
+    return x1 + x2 + x3 + x4 + x5 + x6 + x7 + x8 + x9 + x10 + x11 + x12 + x13 + x14 + x15 + x16
+
+v = Vec(1, 2, 3, 4)
+w = Vec(5, 6, 7, 8)
+print(mix(v, w)) # expect 2*(2+4+6+8+10+12+14+16) + 2*16 + 4*14 + 6*12 + 8*10 = 384
@@ -0,0 +1,24 @@
+# Test 17: values kept live across calls and prints
+class Acc:
+    total: int
+    count: int
+
+def fib(n: int) -> int:
+    if n < 2:
+        return n
+    else:
+        return fib(n - 1) + fib(n - 2)
+
+def report(a: Acc, n: int) -> int:
+    before = a.total
+    f = fib(n)
+    print(f)
+    after = a.count + f
+    print(before)
+    return before * 100 + after
+
+a = Acc(7, 3)
+x = 11
+y = fib(10)
+print(report(a, 6)) # expect 8, 7, then 7 * 100 + 3 + 8 = 711
+print(x + y) # expect 11 + 55 = 66
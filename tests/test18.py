@@ -0,0 +1,31 @@
+# Test 18: calls to leaf and non-leaf helpers, with values live across each call
+class Range:
+    lo: int
+    hi: int
+
+def first_square_above(n: int) -> int:
+    i = 0
+    while i < 100:
+        if i * i > n:
+            return i
+        i = i + 1
+    return 0
+
+def count_down(n: int) -> int:
+    if n == 0:
+        return 0
+    else:
+        return 1 + count_down(n - 1)
+
+def span(r: Range) -> int:
+    lo = r.lo
+    hi = r.hi
+    a = first_square_above(lo)
+    b = first_square_above(hi)
+    c = count_down(b - a)
+    return lo + hi + a * 100 + b * 10 + c
+
+r = Range(10, 50)
+k = 3
+print(span(r)) # expect 10 + 50 + 400 + 80 + 4 = 544
+print(k + first_square_above(k)) # expect 3 + 2 = 5
@@ -0,0 +1,42 @@
+# Test 19: a frameless leaf, a leaf that spills, and a recursive caller that
+# keeps values in callee-saved registers
+class Quad:
+    a: int
+    b: int
+    c: int
+    d: int
+
+def clamp(x: int, hi: int) -> int:
+    while x > hi:
+        return hi
+    return x
+
+def spread(q: Quad, n: int) -> int:
+    x1 = q.a + n
+    x2 = q.b + n
+    x3 = q.c + n
+    x4 = q.d + n
+    x5 = x1 * 2
+    x6 = x2 * 3
+    x7 = x3 * 5
+    x8 = x4 * 7
+    x9 = x1 * x2
+    x10 = x3 * x4
+    x11 = x5 + x8
+    x12 = x6 + x7
+    while n > 100:
+        return 0
+    return x1 + x2 + x3 + x4 + x5 + x6 + x7 + x8 + x9 + x10 + x11 + x12
+
+def walk(q: Quad, n: int) -> int:
+    if n == 0:
+        return 0
+    else:
+        s = spread(q, n)
+        c = clamp(s, 200)
+        return c + walk(q, n - 1) + s
+
+q = Quad(1, 2, 3, 4)
+print(clamp(500, 200)) # expect 200
+print(spread(q, 1)) # expect 2+3+4+5+4+9+20+35+6+20+39+29 = 176
+print(walk(q, 3)) # expect spread 176, 230, 288 -> (176+176) + (200+230) + (200+288) = 1270
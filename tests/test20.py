@@ -0,0 +1,31 @@
+# Test 20: register pressure inside a nested loop, with values live across it
+class Grid:
+    w: int
+    h: int
+
+def checksum(g: Grid) -> int:
+    w = g.w
+    h = g.h
+    c1 = w + 1
+    c2 = h + 2
+    c3 = w + 3
+    c4 = h + 4
+    c5 = w + 5
+    c6 = h + 6
+    c7 = w + 7
+    c8 = h + 8
+    c9 = w + 9
+    c10 = h + 10
+    c11 = w + 11
+    c12 = h + 12
+    total = 0
+    y = 0
+    while y < h:
+        x = 0
+        while x < w:
+            total = total + x * c1 + y * c2 + 7
+            x = x + 1
+        y = y + 1
+    return total + c3 + c4 + c5 + c6 + c7 + c8 + c9 + c10 + c11 + c12 + w + h
+
+print(checksum(Grid(4, 3))) # expect 5*18 + 5*12 + 12*7 + 110 + 7 = 351
@@ -0,0 +1,40 @@
+# Test 21: object pointers live across calls and allocations that collect
+class Triple:
+    a: int
+    b: int
+    c: int
+
+def grow(t: Triple, n: int) -> Triple:
+    a = t.a
+    b = t.b
+    c = t.c
+    while n > 100:
+        return Triple(0, 0, 0)
+    i = 0
+    while i < n:
+        a = a + 1
+        b = b + 2
+        c = c + 3
+        i = i + 1
+    return Triple(a, b, c)
+
+def total(t: Triple) -> int:
+    a = t.a
+    while a > 1000:
+        return 0
+    return a + t.b + t.c
+
+def keep(t: Triple, n: int) -> int:
+    s = grow(t, n)
+    u = grow(s, n)
+    return total(t) * 10000 + total(s) * 100 + total(u)
+
+p = Triple(1, 2, 3)
+q = grow(p, 3)
+r = Triple(q.c, q.b, q.a)
+s = grow(r, 2)
+print(p.a + p.b + p.c) # expect 6
+print(q.a * 100 + q.b * 10 + q.c) # expect 4*100 + 8*10 + 12 = 492
+print(r.a * 100 + r.b * 10 + r.c) # expect 12*100 + 8*10 + 4 = 1284
+print(total(s)) # expect 14 + 12 + 10 = 36
+print(keep(p, 2)) # expect 6 * 10000 + 18 * 100 + 30 = 61830
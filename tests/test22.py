@@ -0,0 +1,29 @@
+# Test 22: pointers with disjoint and overlapping lifetimes across collections
+class Cell:
+    v: int
+    w: int
+    k: int
+
+def bump(c: Cell, d: int) -> Cell:
+    v = c.v
+    while d > 1000:
+        return Cell(0, 0, 0)
+    return Cell(v + d, c.w * 2, c.k)
+
+def weigh(c: Cell) -> int:
+    v = c.v
+    while v > 1000:
+        return 0
+    return v * 100 + c.w * 10 + c.k
+
+a = Cell(1, 1, 1)
+b = bump(a, 1)
+print(weigh(b)) # expect 2*100 + 2*10 + 1 = 221
+c = bump(Cell(2, 2, 2), 2)
+print(weigh(c)) # expect 4*100 + 4*10 + 2 = 442
+d = bump(c, 3)
+e = bump(d, 4)
+f = bump(a, 5)
+print(weigh(f)) # expect 6*100 + 2*10 + 1 = 621
+print(weigh(e) - weigh(d)) # expect (11*100 + 16*10 + 2) - (7*100 + 8*10 + 2) = 480
+print(weigh(a) + weigh(c)) # expect 111 + 442 = 553
@@ -0,0 +1,35 @@
+# Test 23: overlapping live ranges in loops and branches, for linear scan
+class Span:
+    lo: int
+    hi: int
+
+def collatz_steps(n: int) -> int:
+    steps = 0
+    while n > 1:
+        half = 0
+        m = n
+        while m > 1:
+            m = m - 2
+            half = half + 1
+        if m == 0:
+            n = half
+        else:
+            n = 3 * n + 1
+        steps = steps + 1
+    return steps
+
+def longest(s: Span) -> int:
+    best = 0
+    best_n = 0
+    n = s.lo
+    hi = s.hi
+    while n < hi:
+        k = collatz_steps(n)
+        if k > best:
+            best = k
+            best_n = n
+        n = n + 1
+    return best_n * 1000 + best
+
+print(collatz_steps(6)) # expect 8
+print(longest(Span(1, 10))) # expect 9 * 1000 + 19 = 9019
@@ -0,0 +1,26 @@
+# Test 24: a long block mixing field stores, field reads, comparisons and prints
+class Counter:
+    hits: int
+    misses: int
+
+def tally(c: Counter, x: int, y: int) -> int:
+    a = x * 3 + y
+    b = y * 5 - x
+    c.hits = c.hits + a
+    h = c.hits
+    c.misses = c.misses + b
+    m = c.misses
+    big = a > b
+    c.hits = h * 2
+    print(c.hits)
+    d = a - b
+    e = h + m
+    if big:
+        return d + e + c.hits
+    else:
+        return e - d + c.misses
+
+k = Counter(1, 2)
+print(tally(k, 4, 1)) # expect 28, then (13 - 1) + (14 + 3) + 28 = 57
+print(k.hits * 1000 + k.misses) # expect 28 * 1000 + 3 = 28003
+print(tally(k, 1, 4)) # expect 70, then (35 + 22) - (7 - 19) + 22 = 91
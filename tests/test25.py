@@ -0,0 +1,29 @@
+# Test 25: comparisons against constants on either side, and values copied back and forth
+class Box:
+    lo: int
+    hi: int
+
+def classify(b: Box, x: int) -> int:
+    lo = b.lo
+    hi = b.hi
+    r = 0
+    if 5 < x:
+        r = r + 1
+    if 10 >= x:
+        r = r + 10
+    if x == 7:
+        r = r + 100
+    if lo <= x and x < hi:
+        r = r + 1000
+    t = lo
+    lo = hi
+    hi = t
+    if 0 > x:
+        r = r + 10000
+    return r + lo - hi
+
+b = Box(3, 9)
+print(classify(b, 7)) # expect 1 + 10 + 100 + 1000 + 9 - 3 = 1117
+print(classify(b, 2)) # expect 10 + 6 = 16
+print(classify(b, -4)) # expect 10 + 10000 + 6 = 10016
+print(classify(b, 12)) # expect 1 + 6 = 7
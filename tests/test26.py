@@ -0,0 +1,31 @@
+# Test 26: nested branches, empty arms and early returns inside loops
+class Limits:
+    low: int
+    high: int
+
+def bucket(l: Limits, x: int) -> int:
+    low = l.low
+    high = l.high
+    if x < low:
+        if x < 0:
+            return 0
+        else:
+            return 1
+    else:
+        if x < high:
+            y = 0
+        else:
+            y = 0
+    while x > high:
+        x = x - 10
+        if x < low:
+            return 2
+    return 3 + y
+
+l = Limits(5, 20)
+print(bucket(l, -3)) # expect 0
+print(bucket(l, 3)) # expect 1
+print(bucket(l, 12)) # expect 3
+print(bucket(l, 41)) # expect 41 -> 31 -> 21 -> 11: 3
+print(bucket(l, 24)) # expect 24 -> 14: 3
+print(bucket(Limits(18, 20), 25)) # expect 25 -> 15 < 18: 2
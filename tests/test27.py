@@ -0,0 +1,29 @@
+# Test 27: if and while conditions built from comparisons, not, and boolean variables
+class Window:
+    start: int
+    stop: int
+
+def scan(w: Window) -> int:
+    i = w.start
+    stop = w.stop
+    found = False
+    total = 0
+    while not (i >= stop):
+        odd = i - (i - 1) == 1
+        if not found:
+            if 3 == i:
+                found = True
+        if found and odd:
+            total = total + i
+        if not (i < 5):
+            total = total + 100
+        i = i + 1
+    if True:
+        total = total + 1
+    if found:
+        return total
+    else:
+        return 0 - total
+
+print(scan(Window(1, 7))) # expect (3 + 4 + 5 + 6) + 200 + 1 = 219
+print(scan(Window(4, 6))) # expect 0 - (100 + 1) = -101
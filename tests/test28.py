@@ -0,0 +1,20 @@
+# Test 28: arithmetic where the destination is the first, the second or neither operand
+class Pair:
+    x: int
+    y: int
+
+def mix(p: Pair) -> int:
+    x = p.x
+    y = p.y
+    x = y - x
+    y = y - 3
+    z = y + 12
+    x = 2 * x
+    y = x * y
+    w = 100 - z
+    w = z - w
+    x = x + y
+    return x * 10000 + w
+
+print(mix(Pair(3, 10))) # expect x = 14 + 98 = 112, w = 19 - 81 = -62: 1120000 - 62 = 1119938
+print(mix(Pair(10, 3))) # expect x = -14 + 0 = -14, w = 12 - 88 = -76: -140000 - 76 = -140076
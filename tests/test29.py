@@ -0,0 +1,30 @@
+# Test 29: runs of back-to-back allocations under a small heap, with earlier objects still live
+class Point:
+    x: int
+    y: int
+    z: int
+
+def weigh(a: Point, b: Point, c: Point) -> int:
+    ax = a.x
+    while ax > 1000:
+        return 0
+    return ax + b.y * 10 + c.z * 100
+
+def combine(a: Point, b: Point, c: Point) -> int:
+    ax = a.x
+    while ax > 1000:
+        return 0
+    e = Point(ax + b.x, a.y + b.y, a.z + b.z)
+    f = Point(c.x - b.x, c.y - b.y, c.z - b.z)
+    g = Point(e.x, f.y, a.z)
+    return weigh(e, f, g) * 1000 + weigh(g, e, c)
+
+p = Point(1, 2, 3)
+q = Point(4, 5, 6)
+r = Point(7, 9, 11)
+print(combine(p, q, r)) # expect weigh((5,7,9), (3,4,5), (5,4,3)) = 345, weigh((5,4,3), (5,7,9), (7,9,11)) = 1175: 346175
+print(p.x + q.y + r.z) # expect 1 + 5 + 11 = 17
+print(combine(r, p, q)) # expect weigh((8,11,14), (3,3,3), (8,3,11)) = 1138, weigh((8,3,11), (8,11,14), (4,5,6)) = 718: 1138718
+t = Point(r.z, q.z, p.z)
+u = Point(2, 4, 8)
+print(combine(t, u, p) + weigh(p, q, r)) # expect 293 * 1000 + 413 + 1151 = 294564
@@ -0,0 +1,25 @@
+# Test 30: tail calls to the function itself and to another function, deep
+# enough to overflow the stack without them
+class Step:
+    by: int
+    limit: int
+
+def finish(n: int, acc: int) -> int:
+    while n > 0:
+        return acc + n
+    return acc
+
+def count(n: int, acc: int) -> int:
+    if n < 10:
+        return finish(n, acc)
+    else:
+        return count(n - 1, acc + 2)
+
+def walk(s: Step, n: int) -> int:
+    if n > s.limit:
+        return n
+    else:
+        return walk(s, n + s.by)
+
+print(count(3000000, 1)) # expect 1 + 2 * 2999991 + 9 = 5999992
+print(walk(Step(3, 1000000), 0)) # expect 1000002
@@ -0,0 +1,36 @@
+# Test 31: small helpers with early returns and clashing local names, called from other helpers
+class Point:
+    x: int
+    y: int
+
+def absolute(x: int) -> int:
+    if x < 0:
+        return 0 - x
+    y = x
+    return y
+
+def manhattan(a: Point, b: Point) -> int:
+    x = absolute(a.x - b.x)
+    y = absolute(a.y - b.y)
+    return x + y
+
+def nearer(a: Point, b: Point, c: Point) -> int:
+    x = manhattan(a, b)
+    y = manhattan(a, c)
+    if x < y:
+        return 1
+    else:
+        if x == y:
+            return 0
+    return 2
+
+x = 5
+y = absolute(0 - x)
+a = Point(0, 0)
+b = Point(3, -4)
+c = Point(-2, 6)
+print(x * 10 + y) # expect 55
+print(manhattan(b, c)) # expect 5 + 10 = 15
+print(nearer(a, b, c)) # expect 7 < 8: 1
+print(nearer(c, a, Point(-6, 10))) # expect 8 == 8: 0
+print(nearer(b, a, b)) # expect 7 > 0: 2
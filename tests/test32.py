@@ -0,0 +1,28 @@
+# Test 32: constant expressions, constants that disagree across branches and change in loops
+class Config:
+    scale: int
+    debug: bool
+
+def run(c: Config, n: int) -> int:
+    base = 4 * 5 + 2
+    big = 70000 * 70000
+    flag = True and c.debug
+    if 3 > 5:
+        base = 0
+    k = 1
+    if n > 2:
+        k = 2
+    else:
+        k = 3
+    i = 0
+    step = 1
+    while i < n:
+        step = step * 2
+        i = i + 1
+    if flag or False:
+        base = base + 1
+    return base + k * 100 + step * 1000 + big - 69999 * 70001 + c.scale
+
+print(run(Config(7, True), 3)) # expect 23 + 200 + 8000 + 1 + 7 = 8231
+print(run(Config(9, False), 1)) # expect 22 + 300 + 2000 + 1 + 9 = 2332
+print(2 * 3 + 4 - 10) # expect 0
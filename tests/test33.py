@@ -0,0 +1,24 @@
+# Test 33: unused objects and dead assignments, next to calls whose results are unused
+class Pair:
+    a: int
+    b: int
+
+def noisy(n: int) -> int:
+    print(n)
+    while n > 1000:
+        return 0
+    return n * 2
+
+def work(p: Pair, n: int) -> int:
+    unused = Pair(n, n + 1)
+    also_unused = Pair(p.a, p.b)
+    dead = n * 7
+    dead = dead + 1
+    ignored = noisy(n)
+    kept = Pair(p.b, n)
+    return kept.a + kept.b
+
+p = Pair(3, 4)
+q = Pair(p.a + 10, p.b + 10)
+print(work(p, 5)) # expect 5 from noisy, then 4 + 5 = 9
+print(work(q, 1)) # expect 1 from noisy, then 14 + 1 = 15
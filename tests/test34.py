@@ -0,0 +1,30 @@
+# Test 34: repeated field reads, with stores through aliases and calls in between
+class Cell:
+    v: int
+    w: int
+
+def bump(c: Cell) -> int:
+    c.v = c.v + 1
+    w = c.w
+    while w > 1000:
+        return 0
+    return c.v
+
+def reads(a: Cell, b: Cell) -> int:
+    x1 = a.v + a.w
+    x2 = a.v + a.w
+    b.v = 100
+    x3 = a.v + a.w
+    y = bump(a)
+    x4 = a.v + a.w
+    if x1 > 0:
+        x5 = a.v * 2
+    else:
+        x5 = a.w * 2
+    x6 = a.v * 2
+    return x1 + x2 * 10 + x3 * 100 + x4 * 1000 + x5 * 10000 + x6 * 100000 + y
+
+c = Cell(1, 2)
+d = Cell(5, 6)
+print(reads(c, c)) # expect 3 + 30 + 10200 + 103000 + 2020000 + 20200000 + 101 = 22333334
+print(reads(d, c)) # expect 11 + 110 + 1100 + 12000 + 120000 + 1200000 + 6 = 1333227
@@ -0,0 +1,36 @@
+# Test 35: local objects rebuilt in loops and branches, copied, and passed to helpers
+class Vec:
+    x: int
+    y: int
+
+def norm1(v: Vec) -> int:
+    x = v.x
+    y = v.y
+    if x < 0:
+        x = 0 - x
+    if y < 0:
+        y = 0 - y
+    return x + y
+
+def far(v: Vec, w: Vec) -> int:
+    x = v.x
+    while x > 1000:
+        return 0
+    return norm1(Vec(v.x - w.x, v.y - w.y))
+
+def path(n: int) -> int:
+    pos = Vec(0, 0)
+    i = 0
+    while i < n:
+        if i < 3:
+            step = Vec(1, 2)
+        else:
+            step = Vec(-3, 1)
+        pos = Vec(pos.x + step.x, pos.y + step.y)
+        i = i + 1
+    last = pos
+    start = Vec(0, 0)
+    return norm1(last) * 100 + last.x * 10 + far(start, pos)
+
+print(path(0)) # expect 0
+print(path(5)) # expect pos = (-3, 8): 1100 - 30 + 11 = 1081
@@ -0,0 +1,27 @@
+# Test 36: constant objects read by a helper that also gets heap objects, with collections in between
+class Rect:
+    w: int
+    h: int
+    d: int
+
+def volumes(r: Rect, s: Rect, t: Rect) -> int:
+    w = r.w
+    while w > 100000:
+        return 0
+    return w * r.h * r.d + s.w * s.h * s.d * 100 + t.w * t.h * t.d * 10000
+
+def build(n: int) -> Rect:
+    while n > 100000:
+        return Rect(0, 0, 0)
+    return Rect(n, n + 1, n + 2)
+
+unit = Rect(1, 1, 1)
+cube = Rect(2, 2, 2)
+a = build(1)
+b = build(2)
+print(volumes(unit, cube, a)) # expect 1 + 800 + 60000 = 60801
+print(volumes(a, b, cube)) # expect 6 + 2400 + 80000 = 82406
+c = build(3)
+d = build(4)
+print(volumes(c, unit, d)) # expect 60 + 100 + 1200000 = 1200160
+print(unit.w + cube.h + a.d + b.w + c.h + d.d) # expect 1 + 2 + 3 + 2 + 4 + 6 = 18
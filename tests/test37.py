@@ -0,0 +1,10 @@
+# Test 37: a boolean from set and movzbq, next to a compare with an immediate
+i = 0
+while i < 3:
+    i = i + 1
+x = i + i
+b = (0 >= x - 3) or (7 > x)
+if b:
+    print(1) # expect 1
+else:
+    print(2)
@@ -0,0 +1,16 @@
+# Test 38: rebuilding an object from its own fields, in a loop and in an inlined helper's parameter
+class P:
+    x: int
+    y: int
+
+def twist(a3: P) -> int:
+    a3 = P(a3.y * 8, a3.x)
+    return a3.x + a3.y
+
+p = P(1, 2)
+i = 0
+while i < 4:
+    p = P(p.y, p.x)
+    print(p.x) # expect 2, 1, 2, 1
+    i = i + 1
+print(twist(P(3, 4))) # expect 4 * 8 + 3 = 35
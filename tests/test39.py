@@ -0,0 +1,23 @@
+# Test 39: reading a field and passing the same object to a call that updates it, in one expression
+class P:
+    x: int
+    y: int
+
+def bump(p: P) -> int:
+    p.x = p.x + 10
+    y = p.y
+    while y > 1000:
+        return 0
+    return 0
+
+def bump_small(p: P) -> int:
+    p.x = p.x + 10
+    return 0
+
+p = P(1, 2)
+print(p.x + bump(p)) # expect 1
+print(bump(p) + p.x) # expect 21
+print(p.x * 100 + bump(p) + p.x) # expect 2100 + 31 = 2131
+q = P(5, 6)
+print(q.x + bump_small(q)) # expect 5
+print(q.x) # expect 15
@@ -0,0 +1,33 @@
+# Test 40: constant objects held in stack slots because many other values are live
+class Rect:
+    w: int
+    h: int
+    d: int
+
+def volumes(r: Rect, s: Rect, t: Rect) -> int:
+    w = r.w
+    while w > 100000:
+        return 0
+    return w * r.h * r.d + s.w * s.h * s.d * 100 + t.w * t.h * t.d * 10000
+
+def pressure(n: int) -> int:
+    a = Rect(1, 2, 3)
+    b = Rect(2, 2, 2)
+    c = Rect(3, 1, 1)
+    x1 = n + 1
+    x2 = n + 2
+    x3 = n + 3
+    x4 = n + 4
+    x5 = n + 5
+    x6 = n + 6
+    x7 = n + 7
+    x8 = n + 8
+    x9 = n + 9
+    x10 = n + 10
+    x11 = n + 11
+    x12 = n + 12
+    v = volumes(a, b, c)
+    u = volumes(c, a, b)
+    return v + u + x1 + x2 + x3 + x4 + x5 + x6 + x7 + x8 + x9 + x10 + x11 + x12
+
+print(pressure(0)) # expect (6 + 800 + 30000) + (3 + 600 + 80000) + 78 = 111487
@@ -0,0 +1,27 @@
+# Test 41: an object assigned on only one path, with collections before it is used
+class P:
+    x: int
+    y: int
+    z: int
+
+def use(p: P) -> int:
+    x = p.x
+    while x > 100000:
+        return 0
+    return x + p.y + p.z
+
+def build(n: int) -> P:
+    while n > 100000:
+        return P(0, 0, 0)
+    return P(n, n, n)
+
+n = use(build(1))
+if n > 10:
+    p = build(n)
+q = build(1)
+r = build(2)
+print(use(q) + use(r)) # expect 3 + 6 = 9
+if n > 10:
+    print(use(p))
+else:
+    print(n) # expect 3
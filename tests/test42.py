@@ -0,0 +1,61 @@
+# Test 42: many boolean results live at once, so some of them are spilled
+class Bounds:
+    lo: int
+    hi: int
+
+def flags(b: Bounds, x: int) -> int:
+    lo = b.lo
+    hi = b.hi
+    f1 = x > lo
+    f2 = x < hi
+    f3 = x == lo + 1
+    f4 = x >= hi - 2
+    f5 = x <= lo + 3
+    f6 = x > 0
+    f7 = lo < hi
+    f8 = x == hi
+    f9 = x > lo + 2
+    f10 = x < hi - 1
+    f11 = x == 4
+    f12 = x >= 1
+    f13 = hi > 2
+    f14 = lo >= 0
+    f15 = x <= 5
+    f16 = x < 100
+    n = 0
+    if f1:
+        n = n + 1
+    if f2:
+        n = n + 2
+    if f3:
+        n = n + 4
+    if f4:
+        n = n + 8
+    if f5:
+        n = n + 16
+    if f6:
+        n = n + 32
+    if f7:
+        n = n + 64
+    if f8:
+        n = n + 128
+    if f9:
+        n = n + 256
+    if f10:
+        n = n + 512
+    if f11:
+        n = n + 1024
+    if f12:
+        n = n + 2048
+    if f13:
+        n = n + 4096
+    if f14:
+        n = n + 8192
+    if f15:
+        n = n + 16384
+    if f16:
+        n = n + 32768
+    return n
+
+print(flags(Bounds(1, 6), 4)) # expect every flag but f3 and f8: 65535 - 4 - 128 = 65403
+print(flags(Bounds(3, 5), 9)) # expect f1, f4, f6, f7, f9, f12, f13, f14, f16: 1 + 8 + 32 + 64 + 256 + 2048 + 4096 + 8192 + 32768 = 47465
@@ -157,7 +157,7 @@ class X86Program(AST):
 @dataclass(frozen=True, eq=True)
 class X86FunctionDef(AST):
     label: str
-    blocks: Dict[str, List[x86.Instr]]
+    blocks: Dict[str, List[Instr]]
     stack_space: Tuple[int, int]
 
 @dataclass(frozen=True, eq=True)